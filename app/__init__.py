@@ -11,7 +11,6 @@
 # under the License.
 #
 import os
-import pathlib
 
 from app.default_settings import DefaultConfiguration
 
@@ -29,8 +28,6 @@ from flask_sqlalchemy import SQLAlchemy
 
 import redis
 
-import yaml
-
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -55,6 +52,17 @@ def check_redis_connection(cache_config):
     return False
 
 
+def get_redis_client(cache_config):
+    """Return Redis client for the Redis cache configuration"""
+    if cache_config.get("CACHE_REDIS_URL"):
+        return redis.StrictRedis.from_url(cache_config["CACHE_REDIS_URL"])
+    return redis.StrictRedis(
+        host=cache_config.get("CACHE_REDIS_HOST", "localhost"),
+        port=cache_config.get("CACHE_REDIS_PORT", 6379),
+        password=cache_config.get("CACHE_REDIS_PASSWORD"),
+    )
+
+
 # Cache settings
 cache_config_options = [
     "CACHE_TYPE",
@@ -106,10 +114,9 @@ def create_app(test_config=None):
         # TODO(gtema): sooner or later this should be dropped
         app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///example.sqlite"
 
-    config_file = pathlib.Path(app.instance_path, "catalog.yaml")
-    if config_file.exists():
-        with open(config_file, "r") as fd:
-            app.config["CATALOG"] = yaml.safe_load(fd)
+    from app import catalog
+
+    catalog.init_app(app)
 
     # ensure the instance folder exists
     try:
@@ -119,6 +126,24 @@ def create_app(test_config=None):
 
     cache.init_app(app)
     app.logger.debug(f"CACHE_TYPE: {cache.config['CACHE_TYPE']}")
+    if app.config["CACHE_VIEW_TIMEOUT"] is None:
+        if cache.config["CACHE_TYPE"] == "RedisCache":
+            app.config["CACHE_VIEW_TIMEOUT"] = app.config[
+                "CACHE_SHARED_VIEW_TIMEOUT"
+            ]
+        else:
+            app.config["CACHE_VIEW_TIMEOUT"] = int(
+                app.config["CACHE_DEFAULT_TIMEOUT"]
+            )
+    from app import ingestion
+    from app import metrics
+    from app import queries
+    from app.templating import init_bytecode_cache
+
+    ingestion.init_app(app)
+    init_bytecode_cache(app, cache.config)
+    queries.init_app(app)
+    metrics.init_app(app, cache)
     db.init_app(app)
     migrate.init_app(app, db)
     oauth.init_app(app, cache=cache)
@@ -13,6 +13,7 @@
 
 from marshmallow import Schema
 from marshmallow import fields
+from marshmallow import validate
 
 
 class ComponentSearchQueryArgs(Schema):
@@ -41,6 +42,37 @@ class IncidentSchema(Schema):
     updates = fields.List(fields.Nested(IncidentStatusSchema))
 
 
+class IncidentComponentSchema(Schema):
+    id = fields.Integer(dump_only=True)
+    name = fields.String(required=True)
+    attributes = fields.List(fields.Nested(ComponentAttributeSchema))
+
+
+class IncidentExportSchema(IncidentSchema):
+    system = fields.Boolean()
+    components = fields.List(fields.Nested(IncidentComponentSchema))
+
+
+class IncidentExportQueryArgs(Schema):
+    format = fields.String(
+        load_default="ndjson", validate=validate.OneOf(["ndjson"])
+    )
+
+
+class IncidentSearchQueryArgs(Schema):
+    limit = fields.Integer(
+        load_default=100, validate=validate.Range(min=1, max=1000)
+    )
+    after_id = fields.Integer()
+    active = fields.Boolean()
+    impact = fields.Integer()
+    system = fields.Boolean()
+    start_after = fields.DateTime()
+    end_before = fields.DateTime()
+    component_id = fields.Integer()
+    region = fields.String()
+
+
 class ComponentSchema(Schema):
     id = fields.Integer(dump_only=True)
     name = fields.String(required=True)
@@ -53,3 +85,35 @@ class ComponentStatusArgsSchema(Schema):
     name = fields.String(required=True)
     text = fields.String(required=False, dump_default="Incident")
     attributes = fields.List(fields.Nested(ComponentAttributeSchema))
+
+
+class ComponentStatusResultSchema(Schema):
+    status = fields.Integer()
+    message = fields.String()
+    incident = fields.Nested(IncidentSchema, allow_none=True)
+
+
+class IngestionJobSchema(Schema):
+    id = fields.String()
+    state = fields.String()
+    status = fields.Integer()
+    message = fields.String()
+    incident_id = fields.Integer(allow_none=True)
+
+
+class AvailabilityQueryArgs(Schema):
+    component = fields.String()
+    region = fields.String()
+    category = fields.String()
+    start = fields.DateTime(data_key="from")
+    end = fields.DateTime(data_key="to")
+
+
+class AvailabilitySchema(Schema):
+    id = fields.Integer(dump_only=True)
+    name = fields.String(required=True)
+    attributes = fields.List(fields.Nested(ComponentAttributeSchema))
+    start = fields.DateTime(data_key="from", format="%Y-%m-%d %H:%M")
+    end = fields.DateTime(data_key="to", format="%Y-%m-%d %H:%M")
+    outage_minutes = fields.Float()
+    availability = fields.Float()
@@ -0,0 +1,227 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Availability engine
+
+Outages of all components are processed as one batch: intervals are
+merged per component, clipped to month boundaries and reduced into a
+components x months matrix of outage minutes. For arbitrary time windows an
+interval index with prefix sums of outage minutes is provided.
+"""
+from bisect import bisect_left
+from bisect import bisect_right
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _to_minutes(value):
+    return (value - EPOCH).total_seconds() / 60
+
+
+def month_start(value):
+    """Return start of the month of the datetime"""
+    return datetime(value.year, value.month, 1)
+
+
+def last_months(time_now, count):
+    """Return starts of the last `count` months, current month first"""
+    this_month_start = month_start(time_now)
+    return [
+        this_month_start + relativedelta(months=-mon) for mon in range(count)
+    ]
+
+
+def months_between(first, last):
+    """Return starts of all months from `first` to `last` inclusive"""
+    months = []
+    current = month_start(first)
+    while current <= last:
+        months.append(current)
+        current += relativedelta(months=1)
+    return months
+
+
+def month_availability(month, outage_minutes, time_now):
+    """Return availability ratio of the month
+
+    The current month is only taken into account up to `time_now`.
+    """
+    month_end = min(month + relativedelta(months=1), time_now)
+    minutes_in_month = (month_end - month).total_seconds() / 60
+    if minutes_in_month <= 0:
+        return 1
+    return max((minutes_in_month - outage_minutes) / minutes_in_month, 0)
+
+
+def merge_intervals(components, starts, ends):
+    """Merge overlapping outages of the same component
+
+    :param list components: Component ID of every outage.
+    :param list starts: Outage start dates.
+    :param list ends: Outage end dates.
+
+    :returns: Tuple of (components, starts, ends) sorted by component and
+        start date with overlapping intervals merged.
+    """
+    order = sorted(
+        range(len(components)), key=lambda i: (components[i], starts[i])
+    )
+    merged_components = []
+    merged_starts = []
+    merged_ends = []
+    for i in order:
+        if (
+            merged_components
+            and merged_components[-1] == components[i]
+            and starts[i] <= merged_ends[-1]
+        ):
+            merged_ends[-1] = max(merged_ends[-1], ends[i])
+        else:
+            merged_components.append(components[i])
+            merged_starts.append(starts[i])
+            merged_ends.append(ends[i])
+    return merged_components, merged_starts, merged_ends
+
+
+class OutageMatrix:
+    """Outage minutes of components per month
+
+    :param list component_ids: Row labels.
+    :param list months: Column labels (month starts, ascending).
+    :param list minutes: Rows of outage minutes.
+    """
+
+    def __init__(self, component_ids, months, minutes):
+        self.component_ids = component_ids
+        self.months = months
+        self.minutes = minutes
+
+    @classmethod
+    def build(cls, components, starts, ends, months=None):
+        """Build the matrix from parallel lists of outage intervals
+
+        :param list components: Component ID of every outage.
+        :param list starts: Outage start dates.
+        :param list ends: Outage end dates.
+        :param list months: Month starts to calculate. All months touched
+            by the outages are used when not given.
+        """
+        components, starts, ends = merge_intervals(components, starts, ends)
+        if months is None:
+            months = months_between(min(starts), max(ends)) if starts else []
+        months = sorted(months)
+        bounds = [_to_minutes(month) for month in months]
+        if months:
+            bounds.append(_to_minutes(months[-1] + relativedelta(months=1)))
+
+        component_ids = sorted(set(components))
+        rows = {
+            component_id: idx for idx, component_id in enumerate(component_ids)
+        }
+        minutes = [[0.0] * len(months) for _ in component_ids]
+
+        for component_id, start, end in zip(components, starts, ends):
+            row = minutes[rows[component_id]]
+            start = _to_minutes(start)
+            end = _to_minutes(end)
+            idx = max(bisect_right(bounds, start) - 1, 0)
+            while idx < len(months) and bounds[idx] < end:
+                overlap = min(end, bounds[idx + 1]) - max(start, bounds[idx])
+                if overlap > 0:
+                    row[idx] += overlap
+                idx += 1
+
+        return cls(component_ids, months, minutes)
+
+    def items(self):
+        """Iterate over non empty cells
+
+        :returns: Generator of (component_id, month, outage_minutes)
+        """
+        for component_id, row in zip(self.component_ids, self.minutes):
+            for month, minutes in zip(self.months, row):
+                if minutes:
+                    yield component_id, month, minutes
+
+    def availability(self, time_now):
+        """Return availability ratios of all components
+
+        :returns: Dictionary of component id -> {month: availability}
+        """
+        return {
+            component_id: {
+                month: month_availability(month, minutes, time_now)
+                for month, minutes in zip(self.months, row)
+            }
+            for component_id, row in zip(self.component_ids, self.minutes)
+        }
+
+
+class OutageIndex:
+    """Interval index of component outages
+
+    Merged outages of every component are kept as sorted start and end
+    arrays together with prefix sums of outage minutes, so that outage
+    minutes of any time window are calculated in O(log n).
+    """
+
+    def __init__(self, components, starts, ends):
+        components, starts, ends = merge_intervals(components, starts, ends)
+        self._index = {}
+        for component_id, start, end in zip(components, starts, ends):
+            component_starts, component_ends, prefix = self._index.setdefault(
+                component_id, ([], [], [0.0])
+            )
+            component_starts.append(_to_minutes(start))
+            component_ends.append(_to_minutes(end))
+            prefix.append(
+                prefix[-1] + component_ends[-1] - component_starts[-1]
+            )
+
+    def outage_minutes(self, component_id, start, end):
+        """Return outage minutes of the component within the window
+
+        :param int component_id: Component ID.
+        :param datetime start: Window start.
+        :param datetime end: Window end.
+        """
+        if component_id not in self._index:
+            return 0
+        starts, ends, prefix = self._index[component_id]
+        start = _to_minutes(start)
+        end = _to_minutes(end)
+        # First outage ending after the window start and first outage
+        # starting after the window end
+        first = bisect_right(ends, start)
+        last = bisect_left(starts, end)
+        if first >= last:
+            return 0
+        minutes = prefix[last] - prefix[first]
+        if starts[first] < start:
+            minutes -= start - starts[first]
+        if ends[last - 1] > end:
+            minutes -= ends[last - 1] - end
+        return minutes
+
+    def availability(self, component_id, start, end):
+        """Return availability ratio of the component within the window"""
+        window = (end - start).total_seconds() / 60
+        if window <= 0:
+            return 1
+        return max(
+            (window - self.outage_minutes(component_id, start, end)) / window,
+            0,
+        )
@@ -0,0 +1,430 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Synchronization of the component catalog with the database
+
+All components and attributes are loaded with a single query and compared
+with the catalog in memory. A catalog entry matches the component having
+the same name and attributes, otherwise the component having the same name
+and identity attributes (`CATALOG_IDENTITY_ATTRIBUTES`), whose attributes
+are then updated. The resulting diff is applied with bulk statements in a
+single transaction. Components missing in the catalog may be retired: they
+disappear from the dashboard and lookups, but are kept for the incident
+history and restored once they are back in the catalog.
+
+With `CATALOG_RELOAD_INTERVAL` set, every worker looks at the catalog file
+before requests (at most once per interval). A changed catalog is applied to
+the database by a single worker, the others notice that through the cache
+backend and only take the new catalog over. Applying it bumps the catalog
+version and the data generation, so that the lookups and cached views of all
+workers are refreshed.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+from app import cache
+from app import db
+from app import lookup
+from app.generation import bump_generation
+from app.models import Component
+from app.models import ComponentAttribute
+from app.models import reserve_ids
+from app.models import sync_id_sequence
+
+from sqlalchemy import delete
+from sqlalchemy import insert
+from sqlalchemy import select
+from sqlalchemy import update
+
+import yaml
+
+
+CATALOG_FILE = "catalog.yaml"
+# Digest of the catalog file last applied to the database
+APPLIED_CACHE_KEY = "catalog_applied"
+RELOAD_LOCK_CACHE_KEY = "catalog_reload_lock"
+RELOAD_LOCK_TIMEOUT = 300
+
+
+class CatalogDiff:
+    """Changes required to bring the database in line with the catalog"""
+
+    def __init__(self):
+        # List of (name, attributes) of new components
+        self.added = []
+        # List of `ComponentUpdate`
+        self.updated = []
+        # List of (component ID, name, attributes) of components missing in
+        # the catalog
+        self.removed = []
+        self.unchanged = 0
+
+    def has_changes(self, prune=False):
+        return bool(self.added or self.updated or (prune and self.removed))
+
+    def describe(self, prune=False):
+        """Return list of lines describing the changes"""
+        lines = [
+            f"+ {name} {format_attributes(attrs)}"
+            for name, attrs in self.added
+        ]
+        lines.extend(change.describe() for change in self.updated)
+        lines.extend(
+            f"- {name} {format_attributes(attrs)}"
+            for _, name, attrs in self.removed
+        )
+        summary = (
+            f"{len(self.added)} to add, {len(self.updated)} to update, "
+            f"{self.unchanged} unchanged"
+        )
+        if prune:
+            summary += f", {len(self.removed)} to retire"
+        elif self.removed:
+            summary += (
+                f", {len(self.removed)} not in the catalog (retired with "
+                "--prune)"
+            )
+        lines.append(summary)
+        return lines
+
+
+class ComponentUpdate:
+    """Changes of an existing component matching a catalog entry"""
+
+    def __init__(self, component_id, name, restore=False):
+        self.component_id = component_id
+        self.name = name
+        # Retired component back in the catalog
+        self.restore = restore
+        # List of (name, value) of new attributes
+        self.inserts = []
+        # List of (attribute ID, name, current value, new value)
+        self.updates = []
+        # List of (attribute ID, name, current value)
+        self.deletes = []
+
+    def __bool__(self):
+        return bool(
+            self.restore or self.inserts or self.updates or self.deletes
+        )
+
+    def describe(self):
+        changes = []
+        if self.restore:
+            changes.append("restored")
+        changes.extend(
+            f"{name} added ({value})" for name, value in self.inserts
+        )
+        changes.extend(
+            f"{name} {old} -> {new}" for _, name, old, new in self.updates
+        )
+        changes.extend(f"{name} removed" for _, name, _ in self.deletes)
+        return f"~ {self.name} [{self.component_id}]: {', '.join(changes)}"
+
+
+def format_attributes(attributes):
+    return " ".join(f"{key}={val}" for key, val in sorted(attributes.items()))
+
+
+def load_components():
+    """Return dictionary of component ID -> (name, retired, dictionary of
+    attribute name -> (attribute ID, value))
+    """
+    components = {}
+    rows = db.session.execute(
+        select(
+            Component.id,
+            Component.name,
+            Component.retired,
+            ComponentAttribute.id,
+            ComponentAttribute.name,
+            ComponentAttribute.value,
+        )
+        .outerjoin(
+            ComponentAttribute,
+            ComponentAttribute.component_id == Component.id,
+        )
+        .order_by(Component.id)
+    )
+    for comp_id, name, retired, attr_id, attr_name, attr_value in rows:
+        attrs = components.setdefault(comp_id, (name, retired, {}))[2]
+        if attr_id is not None:
+            attrs[attr_name] = (attr_id, attr_value)
+    return components
+
+
+def compute_diff(catalog, identity_attributes, components=None):
+    """Compare the catalog with the database
+
+    :param list catalog: Catalog entries (dictionaries with `name` and
+        optional `attributes`).
+    :param identity_attributes: Names of attributes identifying a component
+        together with its name.
+    :param dict components: Components as returned by `load_components`,
+        loaded when not given.
+
+    :returns: `CatalogDiff`
+    """
+    if components is None:
+        components = load_components()
+
+    def values(attrs):
+        return {key: val for key, (_, val) in attrs.items()}
+
+    def identity(name, attrs):
+        return (name,) + tuple(attrs.get(key) for key in identity_attributes)
+
+    exact = {}
+    identities = {}
+    # Components in the catalog are preferred over retired ones
+    for comp_id, (name, retired, attrs) in sorted(
+        components.items(), key=lambda item: (item[1][1], item[0])
+    ):
+        attrs = values(attrs)
+        exact.setdefault((name, frozenset(attrs.items())), []).append(
+            comp_id
+        )
+        identities.setdefault(identity(name, attrs), []).append(comp_id)
+
+    entries = {}
+    for entry in catalog:
+        attrs = {
+            key: str(val) for key, val in entry.get("attributes", {}).items()
+        }
+        # Duplicate entries describe the same component
+        entries.setdefault((entry["name"], frozenset(attrs.items())), attrs)
+
+    diff = CatalogDiff()
+    matched = set()
+    pending = []
+    for key, attrs in entries.items():
+        comp_id = next(
+            (i for i in exact.get(key, ()) if i not in matched), None
+        )
+        if comp_id is None:
+            pending.append((key[0], attrs))
+            continue
+        matched.add(comp_id)
+        if components[comp_id][1]:
+            diff.updated.append(
+                ComponentUpdate(comp_id, key[0], restore=True)
+            )
+        else:
+            diff.unchanged += 1
+    for name, attrs in pending:
+        comp_id = next(
+            (
+                i
+                for i in identities.get(identity(name, attrs), ())
+                if i not in matched
+            ),
+            None,
+        )
+        if comp_id is None:
+            diff.added.append((name, attrs))
+            continue
+        matched.add(comp_id)
+        _, retired, current = components[comp_id]
+        change = ComponentUpdate(comp_id, name, restore=retired)
+        for attr_name, value in sorted(attrs.items()):
+            if attr_name not in current:
+                change.inserts.append((attr_name, value))
+            elif current[attr_name][1] != value:
+                attr_id, old = current[attr_name]
+                change.updates.append((attr_id, attr_name, old, value))
+        for attr_name, (attr_id, old) in sorted(current.items()):
+            if attr_name not in attrs:
+                change.deletes.append((attr_id, attr_name, old))
+        if change:
+            diff.updated.append(change)
+        else:
+            diff.unchanged += 1
+    diff.removed = [
+        (comp_id, name, values(attrs))
+        for comp_id, (name, retired, attrs) in sorted(components.items())
+        if comp_id not in matched and not retired
+    ]
+    return diff
+
+
+def apply_diff(diff, prune=False):
+    """Apply the diff in a single transaction
+
+    :param CatalogDiff diff: Changes to apply.
+    :param bool prune: Retire components missing in the catalog.
+    """
+    attr_inserts = []
+    attr_updates = []
+    attr_deletes = []
+    restored = []
+    if diff.added:
+        comp_ids = reserve_ids(Component, len(diff.added))
+        db.session.execute(
+            insert(Component),
+            [
+                {"id": comp_id, "name": name}
+                for comp_id, (name, _) in zip(comp_ids, diff.added)
+            ],
+        )
+        sync_id_sequence(Component)
+        for comp_id, (_, attrs) in zip(comp_ids, diff.added):
+            attr_inserts.extend(
+                {"component_id": comp_id, "name": key, "value": val}
+                for key, val in attrs.items()
+            )
+    for change in diff.updated:
+        if change.restore:
+            restored.append(change.component_id)
+        attr_inserts.extend(
+            {"component_id": change.component_id, "name": key, "value": val}
+            for key, val in change.inserts
+        )
+        attr_updates.extend(
+            {"id": attr_id, "value": new}
+            for attr_id, _, _, new in change.updates
+        )
+        attr_deletes.extend(attr_id for attr_id, _, _ in change.deletes)
+    if attr_inserts:
+        db.session.execute(insert(ComponentAttribute), attr_inserts)
+    if attr_updates:
+        db.session.execute(update(ComponentAttribute), attr_updates)
+    if attr_deletes:
+        db.session.execute(
+            delete(ComponentAttribute).where(
+                ComponentAttribute.id.in_(attr_deletes)
+            )
+        )
+    if restored:
+        db.session.execute(
+            update(Component)
+            .where(Component.id.in_(restored))
+            .values(retired=False)
+        )
+    if prune and diff.removed:
+        db.session.execute(
+            update(Component)
+            .where(Component.id.in_([item[0] for item in diff.removed]))
+            .values(retired=True)
+        )
+    db.session.commit()
+
+
+def read_catalog(path):
+    """Return tuple of (catalog, digest of the file content)"""
+    with open(path, "rb") as fd:
+        content = fd.read()
+    return yaml.safe_load(content) or {}, hashlib.sha256(content).hexdigest()
+
+
+class CatalogWatcher:
+    """Reloader of the catalog file of a worker
+
+    :param app: Flask application.
+    :param str path: Catalog file.
+    :param float interval: Seconds between looks at the file.
+    """
+
+    def __init__(self, app, path, interval):
+        self.app = app
+        self.path = path
+        self.interval = interval
+        # Modification time of the file the current catalog was read from
+        self.mtime = None
+        self._next_check = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Reload the catalog when the file has changed
+
+        Only one thread of the worker looks at the file, the others carry
+        on.
+        """
+        now = time.monotonic()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.interval
+            self._check()
+        finally:
+            self._lock.release()
+
+    def _check(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self.mtime:
+            return
+        try:
+            catalog, digest = read_catalog(self.path)
+        except (OSError, yaml.YAMLError):
+            self.app.logger.exception(f"Failed to read {self.path}")
+            # Retried once the file changes again
+            self.mtime = mtime
+            return
+        if cache.get(APPLIED_CACHE_KEY) != digest and not self.apply(
+            catalog, digest
+        ):
+            # Retried on the next check
+            return
+        self.app.config["CATALOG"] = catalog
+        self.mtime = mtime
+
+    def apply(self, catalog, digest):
+        """Apply the catalog to the database unless another worker does
+
+        :returns: True when the catalog has been applied
+        """
+        token = uuid.uuid4().hex
+        if not cache.add(
+            RELOAD_LOCK_CACHE_KEY, token, timeout=RELOAD_LOCK_TIMEOUT
+        ):
+            return False
+        try:
+            # Another worker may have applied it before the lock was taken
+            if cache.get(APPLIED_CACHE_KEY) != digest:
+                prune = self.app.config["CATALOG_RELOAD_PRUNE"]
+                diff = compute_diff(
+                    catalog.get("components", []),
+                    self.app.config["CATALOG_IDENTITY_ATTRIBUTES"],
+                )
+                if diff.has_changes(prune):
+                    apply_diff(diff, prune)
+                    lookup.bump_catalog_version()
+                    bump_generation()
+                    self.app.logger.info(
+                        f"Catalog reloaded: {diff.describe(prune)[-1]}"
+                    )
+                cache.set(APPLIED_CACHE_KEY, digest, timeout=0)
+            return True
+        except Exception:
+            db.session.rollback()
+            self.app.logger.exception("Failed to apply the catalog")
+            return False
+        finally:
+            if cache.get(RELOAD_LOCK_CACHE_KEY) == token:
+                cache.delete(RELOAD_LOCK_CACHE_KEY)
+
+
+def init_app(app):
+    """Load the catalog of the instance and watch it for changes"""
+    path = os.path.join(app.instance_path, CATALOG_FILE)
+    if os.path.exists(path):
+        app.config["CATALOG"] = read_catalog(path)[0]
+    interval = app.config["CATALOG_RELOAD_INTERVAL"]
+    if interval:
+        watcher = CatalogWatcher(app, path, interval)
+        app.extensions["catalog_watcher"] = watcher
+        app.before_request(watcher.check)
@@ -11,12 +11,21 @@
 # under the License.
 #
 
+from app import catalog
 from app import db
+from app import lookup
+from app.generation import bump_generation
 from app.models import Component
 from app.models import ComponentAttribute
+from app.models import ComponentSlaMonth
 from app.models import Incident
 from app.models import IncidentComponentRelation
 from app.models import IncidentStatus
+from app.synth import Synthesizer
+from app.synth import parse_impact_weights
+from app.templating import compile_templates
+
+import click
 
 
 def register(app):
@@ -28,34 +37,137 @@ def register(app):
     @bootstrap.command()
     def purge():
         """Purge current configuration"""
+        db.session.query(ComponentSlaMonth).delete()
         db.session.query(ComponentAttribute).delete()
         db.session.query(IncidentComponentRelation).delete()
         db.session.query(Component).delete()
         db.session.query(IncidentStatus).delete()
         db.session.query(Incident).delete()
         db.session.commit()
+        lookup.bump_catalog_version()
+        bump_generation()
 
     @bootstrap.command()
-    def provision():
-        """Fill database with initial data"""
+    @click.option("--dry-run", is_flag=True, help="Only show the changes.")
+    @click.option(
+        "--prune",
+        is_flag=True,
+        help="Retire components missing in the catalog.",
+    )
+    def provision(dry_run, prune):
+        """Synchronize database with the component catalog"""
 
         if "CATALOG" not in app.config:
             return
 
-        for target_component in app.config["CATALOG"]["components"]:
-            target_attrs = target_component.get("attributes", {})
-            if not Component.find_by_name_and_attributes(
-                target_component["name"], target_attrs
-            ):
-                db_attrs = []
-                for (k, v) in target_attrs.items():
-                    db_attr = ComponentAttribute(name=k, value=v)
-                    db.session.add(db_attr)
-                    db_attrs.append(db_attr)
-                db_comp = Component(
-                    name=target_component["name"],
-                    attributes=db_attrs,
-                )
-                db.session.add(db_comp)
+        diff = catalog.compute_diff(
+            app.config["CATALOG"]["components"],
+            app.config["CATALOG_IDENTITY_ATTRIBUTES"],
+        )
+        for line in diff.describe(prune):
+            click.echo(line)
+        if dry_run or not diff.has_changes(prune):
+            return
+        catalog.apply_diff(diff, prune)
+        # Bulk statements are not tracked by the session listeners
+        lookup.bump_catalog_version()
+        bump_generation()
 
+    @bootstrap.command()
+    def rebuild_sla():
+        """Rebuild monthly availability rollup from the incident history"""
+        ComponentSlaMonth.update_components()
         db.session.commit()
+        bump_generation()
+
+    @bootstrap.command()
+    @click.option("--regions", default=3, show_default=True)
+    @click.option(
+        "--categories",
+        default=4,
+        show_default=True,
+        help="Number of categories per region.",
+    )
+    @click.option(
+        "--components",
+        default=5,
+        show_default=True,
+        help="Number of components per category.",
+    )
+    @click.option(
+        "--years", default=1.0, show_default=True, help="Length of history."
+    )
+    @click.option("--incidents-per-day", default=5.0, show_default=True)
+    @click.option("--maintenances-per-month", default=10.0, show_default=True)
+    @click.option(
+        "--mean-duration",
+        default=60.0,
+        show_default=True,
+        help="Mean duration of incidents in minutes.",
+    )
+    @click.option(
+        "--updates",
+        default=2.0,
+        show_default=True,
+        help="Mean number of status updates per incident.",
+    )
+    @click.option(
+        "--max-components",
+        default=3,
+        show_default=True,
+        help="Maximal number of components affected by an incident.",
+    )
+    @click.option(
+        "--impact-weights",
+        default="1:6,2:3,3:1",
+        show_default=True,
+        help="Relative frequency of incident impacts.",
+    )
+    @click.option(
+        "--chunk-size",
+        default=10000,
+        show_default=True,
+        help="Number of incidents inserted at once.",
+    )
+    @click.option("--seed", type=int, help="Seed of the random generator.")
+    @click.option(
+        "--rebuild-sla/--no-rebuild-sla",
+        default=True,
+        show_default=True,
+        help="Rebuild monthly availability rollup afterwards.",
+    )
+    def synth(impact_weights, chunk_size, rebuild_sla, **kwargs):
+        """Generate synthetic catalog and incident history"""
+        try:
+            weights = parse_impact_weights(impact_weights)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--impact-weights")
+        synthesizer = Synthesizer(impact_weights=weights, **kwargs)
+
+        def progress(counts):
+            click.echo(f"Inserted {counts['incident']} incidents")
+
+        counts = synthesizer.load(chunk_size=chunk_size, progress=progress)
+        lookup.bump_catalog_version()
+        if rebuild_sla:
+            ComponentSlaMonth.update_components()
+            db.session.commit()
+        bump_generation()
+        for table, count in counts.items():
+            click.echo(f"{table}: {count}")
+
+    @app.cli.command("compile-templates")
+    def compile_templates_command():
+        """Compile all templates into the bytecode cache"""
+        if app.jinja_env.bytecode_cache is None:
+            raise click.ClickException(
+                "Template bytecode cache is not configured"
+            )
+        compiled, errors = compile_templates(app)
+        for name, error in sorted(errors.items()):
+            click.echo(f"Failed to compile {name}: {error}", err=True)
+        click.echo(f"Compiled {len(compiled)} templates")
+        if errors:
+            raise click.ClickException(
+                f"{len(errors)} templates failed to compile"
+            )
@@ -0,0 +1,157 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Coalescing of component status signals
+
+Once a signal has been applied, the open incident covering the component is
+remembered in the cache backend for `API_COALESCING_WINDOW` seconds.
+Further signals for the component with the same or a lower impact arriving
+within the window are answered from the cache without touching the
+database. Signals with a higher impact are applied as usual.
+
+The entry of the component refers to a version of the incident which is
+dropped whenever the incident is closed, its impact is changed or
+components are removed from it, so that a stale entry is never used.
+"""
+import itertools
+import threading
+import uuid
+
+from app import cache
+
+from flask import current_app
+from flask import has_app_context
+
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+
+WINDOW_CACHE_KEY = "coalescing:component:{}"
+INCIDENT_CACHE_KEY = "coalescing:incident:{}"
+COUNTER_CACHE_KEY = "coalescing:counter:{}"
+COUNTERS = ("duplicate", "merged")
+
+_counter_lock = threading.Lock()
+
+
+def get_window():
+    """Return length of the coalescing window in seconds (0 - disabled)"""
+    return current_app.config["API_COALESCING_WINDOW"]
+
+
+def find(component_id, impact):
+    """Return the remembered incident covering the signal
+
+    :param int component_id: ID of the component the signal is about.
+    :param int impact: Requested impact.
+
+    :returns: Dictionary with `incident_id`, `incident_text`, `impact` and
+        `target_component` or None when the signal has to be applied
+    """
+    if not get_window() or component_id is None:
+        return None
+    entry = cache.get(WINDOW_CACHE_KEY.format(component_id))
+    if entry is None or impact > entry["impact"]:
+        return None
+    version = cache.get(INCIDENT_CACHE_KEY.format(entry["incident_id"]))
+    if version is None or version != entry["version"]:
+        return None
+    return entry
+
+
+def remember(component_id, incident, target_component):
+    """Remember the incident covering the component for the window
+
+    Only open incidents are remembered, maintenances are not.
+
+    :param int component_id: ID of the component.
+    :param Incident incident: Incident the signal has been applied to.
+    :param str target_component: Component with attributes as reported in
+        the responses.
+    """
+    window = get_window()
+    if not window or not incident.impact or incident.end_date is not None:
+        return
+    key = INCIDENT_CACHE_KEY.format(incident.id)
+    # Another worker may have versioned the incident meanwhile
+    cache.add(key, uuid.uuid4().hex, timeout=0)
+    version = cache.get(key)
+    if version is None:
+        return
+    cache.set(
+        WINDOW_CACHE_KEY.format(component_id),
+        {
+            "incident_id": incident.id,
+            "incident_text": incident.text,
+            "impact": incident.impact,
+            "target_component": target_component,
+            "version": version,
+        },
+        timeout=window,
+    )
+
+
+def count(counter, value=1):
+    """Increase the counter of coalesced signals
+
+    :param str counter: `duplicate` for signals answered from the window,
+        `merged` for signals merged with a higher impact signal of the same
+        batch.
+    """
+    key = COUNTER_CACHE_KEY.format(counter)
+    if cache.config.get("CACHE_TYPE") == "RedisCache":
+        cache.cache.inc(key, value)
+    else:
+        # `inc` of other backends would reset the timeout of the counter
+        with _counter_lock:
+            cache.set(key, (cache.get(key) or 0) + value, timeout=0)
+
+
+def get_counters():
+    """Return dictionary of counter name -> number of coalesced signals"""
+    return {
+        counter: int(cache.get(COUNTER_CACHE_KEY.format(counter)) or 0)
+        for counter in COUNTERS
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _track_incident_changes(session, flush_context):
+    changed = session.info.setdefault("coalescing_incidents", set())
+    for obj in itertools.chain(session.dirty, session.deleted):
+        if getattr(obj, "__tablename__", None) != "incident":
+            continue
+        if obj in session.deleted:
+            changed.add(obj.id)
+            continue
+        attrs = inspect(obj).attrs
+        if (
+            attrs.end_date.history.has_changes()
+            or attrs.impact.history.has_changes()
+            or attrs.components.history.deleted
+        ):
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_incident_changes(session):
+    changed = session.info.pop("coalescing_incidents", None)
+    if changed and has_app_context():
+        cache.delete_many(
+            *[INCIDENT_CACHE_KEY.format(inc_id) for inc_id in changed]
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_incident_changes(session):
+    session.info.pop("coalescing_incidents", None)
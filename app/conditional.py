@@ -0,0 +1,82 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Conditional GET support
+
+Responses of polled endpoints carry an ETag derived from the data
+generation (and the validity period of the current state for views
+depending on the current time). Requests with a matching `If-None-Match`
+header are answered with 304 before the view is invoked, so nothing is
+rendered or serialized and at most the validity period is queried.
+
+No Last-Modified is sent: HTTP dates have a precision of a second, clients
+revalidating with `If-Modified-Since` would miss a write following another
+one within the same second.
+"""
+import functools
+
+from app.generation import get_generation
+from app.snapshot import get_validity
+
+from flask import Response
+from flask import make_response
+from flask import request
+from flask import session
+
+from werkzeug.http import is_resource_modified
+
+
+def get_etag(time_dependent=False):
+    """Return ETag of the current data
+
+    :param bool time_dependent: Whether the response also changes when an
+        incident or a maintenance starts or reaches its end date. The
+        period is also renewed after `CACHE_VIEW_TIMEOUT` seconds, which
+        bounds the staleness when writes of other workers are not noticed.
+    """
+    etag = get_generation()
+    if time_dependent:
+        since, _ = get_validity()
+        etag = f"{etag}-{since:%Y%m%d%H%M%S%f}"
+    return etag
+
+
+def conditional(time_dependent=False):
+    """Answer conditional GET requests of the view
+
+    Pages of logged in users are personalized and are never answered with
+    304.
+
+    :param bool time_dependent: See `get_etag`.
+    """
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or "user" in session:
+                return f(*args, **kwargs)
+
+            etag = get_etag(time_dependent)
+            if not is_resource_modified(request.environ, etag=etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Clients may keep the response, but must revalidate it
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
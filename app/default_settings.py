@@ -33,6 +33,54 @@ class DefaultConfiguration:
     CACHE_KEY_PREFIX = "sdb_cache:"
     CACHE_DEFAULT_TIMEOUT = 30
     CACHE_TYPE = "SimpleCache"
+    # cached views are bound to the data generation and are invalidated by
+    # writes, so they may be kept for long with a cache shared by all
+    # workers (CACHE_SHARED_VIEW_TIMEOUT), generations of a per-process
+    # cache are only bumped in the worker handling the write
+    # (CACHE_DEFAULT_TIMEOUT), None - chosen by the cache backend
+    CACHE_VIEW_TIMEOUT = None
+    CACHE_SHARED_VIEW_TIMEOUT = 3600
+    # component status signals are queued and applied in the background,
+    # requires RedisCache unless the queue of the process is allowed (single
+    # worker only)
+    API_ASYNC_INGESTION = False
+    API_INGESTION_LOCAL_QUEUE = False
+    API_INGESTION_BATCH_SIZE = 100
+    API_INGESTION_RESULT_TIMEOUT = 3600
+    # seconds signals covered by a recently applied one are answered from the
+    # cache, 0 disables coalescing
+    API_COALESCING_WINDOW = 0
+    # latest events kept for resuming event streams, seconds between
+    # keep-alive comments and seconds streams are kept open (0 - unlimited)
+    API_EVENTS_HISTORY = 1000
+    API_EVENTS_KEEPALIVE = 15
+    API_EVENTS_MAX_AGE = 300
+    # streams open at once in a worker process (0 - unlimited), keep it
+    # below the number of worker threads
+    API_EVENTS_MAX_STREAMS = 16
+    # seconds rejected stream clients are asked to wait before reconnecting
+    API_EVENTS_RETRY_AFTER = 30
+    # persistent cache of compiled templates ("filesystem" or "redis"), the
+    # directory defaults to "jinja_cache" in the instance folder
+    TEMPLATE_BYTECODE_CACHE = None
+    TEMPLATE_BYTECODE_CACHE_DIR = None
+    # attributes identifying a component together with its name when the
+    # catalog is provisioned, other attributes are updated
+    CATALOG_IDENTITY_ATTRIBUTES = ["region"]
+    # seconds between looks at the catalog file, changes are applied to the
+    # database without a restart (0 - off), optionally retiring components
+    # missing in it
+    CATALOG_RELOAD_INTERVAL = 0
+    CATALOG_RELOAD_PRUNE = False
+    # months of incident history shown at once
+    HISTORY_PAGE_MONTHS = 3
+    # expose Prometheus metrics at /metrics (not authenticated, keep it
+    # reachable by the scraper only)
+    METRICS_ENABLED = False
+    # log statements issued at least this many times within a request as N+1
+    # suspects and requests issuing more queries than the budget (0 - off)
+    SQL_REPEATED_QUERY_THRESHOLD = 10
+    SQL_QUERY_BUDGET = 0
 
     # Incident impacts map
     # key - integer to identify impact and compare "severity"
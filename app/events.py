@@ -0,0 +1,320 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Stream of status change events
+
+Changes of incidents are collected when the session is flushed and
+published once it is committed. Events get increasing IDs and the latest
+ones are kept, so that subscribers can resume after reconnecting. Events are
+distributed through Redis pub/sub when `RedisCache` is configured (reaching
+subscribers of all workers) and within the process otherwise.
+"""
+import collections
+import itertools
+import json
+import threading
+
+from app import cache
+from app import get_redis_client
+from app.datetime import naive_utcnow
+
+from flask import current_app
+from flask import has_app_context
+
+import redis
+
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+
+REDIS_CHANNEL = "sdb_events"
+REDIS_HISTORY_KEY = "sdb_events_history"
+REDIS_SEQUENCE_KEY = "sdb_events_sequence"
+
+# Event sent instead of the missed ones when they are not kept anymore
+RESET_EVENT = {"id": None, "type": "reset", "data": {}}
+
+
+class LocalBroker:
+    """Broker for subscribers of the current process
+
+    :param int history: Number of latest events kept for resuming.
+    """
+
+    def __init__(self, history):
+        self._events = collections.deque(maxlen=history)
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def publish(self, events):
+        with self._condition:
+            for event_type, data in events:
+                self._sequence += 1
+                self._events.append(
+                    {"id": self._sequence, "type": event_type, "data": data}
+                )
+            self._condition.notify_all()
+
+    def _since(self, last_id):
+        if last_id > self._sequence or (
+            self._events and self._events[0]["id"] > last_id + 1
+        ):
+            return [RESET_EVENT]
+        return [item for item in self._events if item["id"] > last_id]
+
+    def subscribe(self, last_id, timeout):
+        """Yield events following `last_id`, None after `timeout` seconds
+        without any
+
+        :param int last_id: ID of the last event received by the subscriber
+            or None to receive only new events.
+        :param float timeout: Seconds to wait for an event.
+        """
+        with self._condition:
+            if last_id is None:
+                last_id = self._sequence
+        while True:
+            with self._condition:
+                pending = self._since(last_id)
+                if not pending:
+                    self._condition.wait(timeout)
+                    pending = self._since(last_id)
+                if pending:
+                    last_id = self._sequence
+            if not pending:
+                yield None
+            for item in pending:
+                yield item
+
+
+class RedisBroker:
+    """Broker for subscribers of all workers using Redis pub/sub
+
+    :param client: Redis client.
+    :param int history: Number of latest events kept for resuming.
+    """
+
+    def __init__(self, client, history):
+        self.client = client
+        self.history = history
+
+    def publish(self, events):
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.incrby(REDIS_SEQUENCE_KEY, len(events))
+            last_id = pipe.execute()[0]
+        with self.client.pipeline(transaction=True) as pipe:
+            for item_id, (event_type, data) in enumerate(
+                events, start=last_id - len(events) + 1
+            ):
+                item = json.dumps(
+                    {"id": item_id, "type": event_type, "data": data}
+                )
+                pipe.lpush(REDIS_HISTORY_KEY, item)
+                pipe.publish(REDIS_CHANNEL, item)
+            pipe.ltrim(REDIS_HISTORY_KEY, 0, self.history - 1)
+            pipe.execute()
+
+    def _since(self, last_id):
+        sequence = int(self.client.get(REDIS_SEQUENCE_KEY) or 0)
+        # History is kept newest first
+        kept = [
+            json.loads(item)
+            for item in reversed(self.client.lrange(REDIS_HISTORY_KEY, 0, -1))
+        ]
+        if last_id > sequence or (kept and kept[0]["id"] > last_id + 1):
+            return [RESET_EVENT]
+        return [item for item in kept if item["id"] > last_id]
+
+    def subscribe(self, last_id, timeout):
+        """Yield events following `last_id`, None after `timeout` seconds
+        without any
+
+        See `LocalBroker.subscribe`.
+        """
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(REDIS_CHANNEL)
+        try:
+            # Events published after subscribing may be received with the
+            # kept ones too, duplicates are skipped by their IDs
+            resumed = set()
+            if last_id is not None:
+                for item in self._since(last_id):
+                    resumed.add(item["id"])
+                    yield item
+            while True:
+                message = pubsub.get_message(timeout=timeout)
+                if message is None:
+                    yield None
+                    continue
+                item = json.loads(message["data"])
+                if item["id"] not in resumed:
+                    yield item
+        finally:
+            pubsub.close()
+
+    @classmethod
+    def from_cache_config(cls, config, history):
+        return cls(get_redis_client(config), history)
+
+
+class StreamSlots:
+    """Limit of event streams open at once in the current process
+
+    :param int limit: Number of streams, 0 for no limit.
+    """
+
+    def __init__(self, limit):
+        self._slots = threading.BoundedSemaphore(limit) if limit else None
+
+    def acquire(self):
+        """Take a slot, return False when all of them are taken"""
+        return self._slots is None or self._slots.acquire(blocking=False)
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+
+def get_stream_slots(app):
+    """Return the event stream slots of the application"""
+    slots = app.extensions.get("event_streams")
+    if slots is None:
+        slots = StreamSlots(app.config["API_EVENTS_MAX_STREAMS"])
+        app.extensions["event_streams"] = slots
+    return slots
+
+
+def get_broker(app):
+    """Return the event broker of the application"""
+    broker = app.extensions.get("events")
+    if broker is None:
+        history = app.config["API_EVENTS_HISTORY"]
+        if cache.config.get("CACHE_TYPE") == "RedisCache":
+            broker = RedisBroker.from_cache_config(cache.config, history)
+        else:
+            broker = LocalBroker(history)
+        app.extensions["events"] = broker
+    return broker
+
+
+def format_event(item):
+    """Format the event (or keep-alive for None) as Server-Sent Event"""
+    if item is None:
+        return ": keep-alive\n\n"
+    lines = []
+    if item["id"] is not None:
+        lines.append(f"id: {item['id']}")
+    lines.append(f"event: {item['type']}")
+    lines.append(f"data: {json.dumps(item['data'], sort_keys=True)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _incident_data(incident):
+    return {
+        "id": incident.id,
+        "text": incident.text,
+        "impact": incident.impact,
+        "system": incident.system,
+        "start_date": (
+            incident.start_date.isoformat() if incident.start_date else None
+        ),
+        "end_date": (
+            incident.end_date.isoformat() if incident.end_date else None
+        ),
+    }
+
+
+def _component_data(component, incident, change):
+    return {
+        "component_id": component.id,
+        "incident_id": incident.id,
+        "impact": incident.impact,
+        "change": change,
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_events(session, flush_context):
+    # Ordered mapping of (kind, ids) -> (event type, data), so that an
+    # object changed by several flushes is reported once with its final
+    # state
+    pending = session.info.setdefault("events", {})
+
+    def add(key, event_type, data):
+        previous = pending.get(key)
+        if previous and previous[0] in ("incident.opened", "incident.closed"):
+            event_type = previous[0]
+        pending[key] = (event_type, data)
+
+    for obj in itertools.chain(session.new, session.dirty):
+        table = getattr(obj, "__tablename__", None)
+        if table == "incident_status" and obj in session.new:
+            incident = obj.incident
+            if incident is not None:
+                add(
+                    ("incident", incident.id),
+                    "incident.updated",
+                    _incident_data(incident),
+                )
+        if table != "incident":
+            continue
+        if obj in session.new:
+            add(("incident", obj.id), "incident.opened", _incident_data(obj))
+            for comp in obj.components:
+                pending[("component", comp.id, obj.id)] = (
+                    "component.status",
+                    _component_data(comp, obj, "added"),
+                )
+            continue
+        attrs = inspect(obj).attrs
+        if not session.is_modified(obj, include_collections=True):
+            continue
+        closed = (
+            attrs.end_date.history.added
+            and obj.end_date is not None
+            and obj.end_date <= naive_utcnow()
+        )
+        add(
+            ("incident", obj.id),
+            "incident.closed" if closed else "incident.updated",
+            _incident_data(obj),
+        )
+        history = attrs.components.history
+        for comp in history.added or ():
+            pending[("component", comp.id, obj.id)] = (
+                "component.status",
+                _component_data(comp, obj, "added"),
+            )
+        removed = list(history.deleted or ())
+        if closed:
+            removed.extend(obj.components)
+        for comp in removed:
+            pending[("component", comp.id, obj.id)] = (
+                "component.status",
+                _component_data(comp, obj, "removed"),
+            )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    pending = session.info.pop("events", None)
+    if pending and has_app_context():
+        try:
+            get_broker(current_app).publish(list(pending.values()))
+        except redis.RedisError:
+            current_app.logger.exception("Failed to publish events")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session):
+    session.info.pop("events", None)
@@ -0,0 +1,95 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Data generation
+
+The generation is stored in the cache backend and changes whenever
+incidents, their updates or components are committed. It is part of the
+keys of cached views and API responses, so that these can be cached for
+hours while every write becomes visible with the next request of any
+worker.
+"""
+import itertools
+import uuid
+
+from app import cache
+
+from flask import has_app_context
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+GENERATION_CACHE_KEY = "data_generation"
+GENERATION_TABLES = (
+    "component",
+    "component_attribute",
+    "component_sla_month",
+    "incident",
+    "incident_status",
+)
+
+
+def get_generation():
+    """Return the current data generation
+
+    A new generation is started when the value is missing (not initialized
+    yet or evicted), so that entries cached before cannot be reused.
+    """
+    generation = cache.get(GENERATION_CACHE_KEY)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        # Another worker may have started the generation meanwhile
+        cache.add(GENERATION_CACHE_KEY, generation, timeout=0)
+        generation = cache.get(GENERATION_CACHE_KEY) or generation
+    return generation
+
+
+def bump_generation():
+    """Invalidate everything cached for the current generation"""
+    cache.set(GENERATION_CACHE_KEY, uuid.uuid4().hex, timeout=0)
+
+
+def versioned_key(key):
+    """Return cache key bound to the current data generation"""
+    return f"{key}:{get_generation()}"
+
+
+def mark_data_changed(session):
+    """Start a new generation once the session is committed
+
+    Changes made with bulk statements are not noticed by the session
+    listeners and have to be marked explicitly.
+    """
+    session.info["data_changed"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _track_data_changes(session, flush_context):
+    if any(
+        getattr(obj, "__tablename__", None) in GENERATION_TABLES
+        for obj in itertools.chain(
+            session.new, session.dirty, session.deleted
+        )
+    ):
+        mark_data_changed(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_data_changes(session):
+    if session.info.pop("data_changed", False) and has_app_context():
+        bump_generation()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_data_changes(session):
+    session.info.pop("data_changed", None)
@@ -0,0 +1,233 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Asynchronous ingestion of component status signals
+
+Accepted signals are put into a queue and applied by a background worker
+thread in batches. The queue is kept in a Redis list shared by all workers
+and outcomes of the jobs are stored in the cache backend under their
+tracking IDs, which therefore requires `RedisCache`. The queue of the
+process memory (`API_INGESTION_LOCAL_QUEUE`) is only suitable for a single
+worker, since outcomes would not be found by the others.
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from app import cache
+from app import db
+from app import get_redis_client
+
+import redis
+
+
+JOB_CACHE_KEY = "ingestion_job:{}"
+REDIS_QUEUE_KEY = "sdb_ingestion_queue"
+
+
+class LocalQueue:
+    """Queue of the current process"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def put(self, item):
+        self._queue.put(item)
+
+    def get_batch(self, size, timeout):
+        """Wait for the first item and return up to `size` items"""
+        try:
+            items = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(items) < size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+
+class RedisQueue:
+    """Queue shared by all workers using the Redis list"""
+
+    def __init__(self, client, key=REDIS_QUEUE_KEY):
+        self.client = client
+        self.key = key
+
+    def put(self, item):
+        self.client.lpush(self.key, json.dumps(item))
+
+    def get_batch(self, size, timeout):
+        """Wait for the first item and return up to `size` items"""
+        first = self.client.brpop(self.key, timeout=timeout)
+        if not first:
+            return []
+        items = [json.loads(first[1])]
+        if size > 1:
+            # Items are pushed to the head, the oldest ones are at the tail
+            with self.client.pipeline(transaction=True) as pipe:
+                pipe.lrange(self.key, -(size - 1), -1)
+                pipe.ltrim(self.key, 0, -size)
+                rest, _ = pipe.execute()
+            items.extend(json.loads(item) for item in reversed(rest))
+        return items
+
+    @classmethod
+    def from_cache_config(cls, config):
+        return cls(get_redis_client(config))
+
+
+class IngestionQueue:
+    """Queue of signals with a worker applying them in batches
+
+    :param app: Flask application.
+    :param callable handler: Function applying a list of signals and
+        returning a result dictionary (`status`, `message` and optionally
+        `incident`) for every signal.
+    :param backend: `LocalQueue` or `RedisQueue`.
+    """
+
+    def __init__(self, app, handler, backend):
+        self.app = app
+        self.handler = handler
+        self.backend = backend
+        self.batch_size = app.config["API_INGESTION_BATCH_SIZE"]
+        self.result_timeout = app.config["API_INGESTION_RESULT_TIMEOUT"]
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, signal, url_root):
+        """Enqueue the signal
+
+        :param dict signal: Validated signal.
+        :param str url_root: Root URL of the application, used for links in
+            incident updates.
+
+        :returns: Tracking ID of the job
+        """
+        job_id = uuid.uuid4().hex
+        cache.set(
+            JOB_CACHE_KEY.format(job_id),
+            {"id": job_id, "state": "queued"},
+            timeout=self.result_timeout,
+        )
+        self.backend.put(
+            {"id": job_id, "signal": signal, "url_root": url_root}
+        )
+        self.start()
+        return job_id
+
+    def start(self):
+        """Start the worker thread unless it is running already"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="ingestion", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = self.backend.get_batch(self.batch_size, timeout=1)
+            except redis.RedisError:
+                self.app.logger.exception("Failed to read ingestion queue")
+                time.sleep(1)
+                continue
+            if batch:
+                self.process(batch)
+
+    def process(self, batch):
+        """Apply the batch of queued items and store outcomes of the jobs"""
+        with self.app.app_context() as ctx:
+            # Links to incidents are built for the URL signals were sent to
+            url_root = urlsplit(batch[0]["url_root"])
+            ctx.url_adapter = self.app.url_map.bind(
+                url_root.netloc,
+                script_name=url_root.path,
+                url_scheme=url_root.scheme,
+            )
+            try:
+                results = self.handler([item["signal"] for item in batch])
+                jobs = [
+                    {
+                        "id": item["id"],
+                        "state": "done",
+                        "status": result["status"],
+                        "message": result["message"],
+                        "incident_id": (
+                            result["incident"].id
+                            if result.get("incident")
+                            else None
+                        ),
+                    }
+                    for item, result in zip(batch, results)
+                ]
+            except Exception:
+                self.app.logger.exception("Failed to apply queued signals")
+                db.session.rollback()
+                jobs = [
+                    {
+                        "id": item["id"],
+                        "state": "failed",
+                        "status": 500,
+                        "message": "Signal could not be applied",
+                        "incident_id": None,
+                    }
+                    for item in batch
+                ]
+            for job in jobs:
+                cache.set(
+                    JOB_CACHE_KEY.format(job["id"]),
+                    job,
+                    timeout=self.result_timeout,
+                )
+
+
+def init_app(app):
+    """Check that the ingestion queue is shared by all workers"""
+    if (
+        app.config["API_ASYNC_INGESTION"]
+        and cache.config.get("CACHE_TYPE") != "RedisCache"
+        and not app.config["API_INGESTION_LOCAL_QUEUE"]
+    ):
+        raise RuntimeError(
+            "API_ASYNC_INGESTION requires RedisCache, set "
+            "API_INGESTION_LOCAL_QUEUE to use the queue of the process "
+            "with a single worker"
+        )
+
+
+def get_job(job_id):
+    """Return state of the job or None when it is not known"""
+    return cache.get(JOB_CACHE_KEY.format(job_id))
+
+
+def get_queue(app, handler):
+    """Return the ingestion queue of the application
+
+    :param app: Flask application.
+    :param callable handler: See `IngestionQueue`.
+    """
+    ingestion = app.extensions.get("ingestion")
+    if ingestion is None:
+        if cache.config.get("CACHE_TYPE") == "RedisCache":
+            backend = RedisQueue.from_cache_config(cache.config)
+        else:
+            backend = LocalQueue()
+        ingestion = IngestionQueue(app, handler, backend)
+        app.extensions["ingestion"] = ingestion
+    return ingestion
@@ -0,0 +1,166 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Process local component lookup index
+
+The index is built once per worker from the component catalog and answers
+lookups by name and attributes with set intersections. It is dropped when
+components or their attributes are flushed in this process and rebuilt
+when the catalog version stored in the cache backend changes, so that other
+workers pick up catalog changes as well. Changes made by processes not
+sharing the cache backend (e.g. the CLI next to workers using SimpleCache)
+are not announced, therefore the index is also rebuilt after
+`CACHE_VIEW_TIMEOUT` seconds and lookups missing in it fall back to the
+database (see `app.models.Component`).
+"""
+import itertools
+import time
+import uuid
+
+from app import cache
+
+from flask import current_app
+from flask import has_app_context
+
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+
+CATALOG_VERSION_CACHE_KEY = "catalog_version"
+CATALOG_TABLES = ("component", "component_attribute")
+# Relations of catalog entities not affecting the lookups
+IGNORED_RELATIONS = ("incidents",)
+
+
+class ComponentIndex:
+    """Inverted index of components
+
+    :param rows: Iterable of (component id, component name, attribute
+        name, attribute value) tuples. Attribute name and value are None
+        for components without attributes.
+    """
+
+    def __init__(self, rows):
+        self.names = {}
+        self.attributes = {}
+        self.components = {}
+        for component_id, name, attr_name, attr_value in rows:
+            self.names.setdefault(name, set()).add(component_id)
+            attrs = self.components.setdefault(component_id, {})
+            if attr_name is not None:
+                attrs[attr_name] = attr_value
+                self.attributes.setdefault(attr_name, {}).setdefault(
+                    attr_value, set()
+                ).add(component_id)
+
+    def match(self, attributes, name=None):
+        """Return IDs of components having all given attributes
+
+        :param dict attributes: Attributes the component must have.
+        :param str name: Component name, any name when not given.
+
+        :returns: Set of component IDs
+        """
+        if name is not None:
+            result = self.names.get(name, set())
+        else:
+            result = self.components.keys()
+        for key, val in attributes.items():
+            result = self.attributes.get(key, {}).get(val, set()) & result
+            if not result:
+                break
+        return set(result)
+
+    def find(self, name, attributes):
+        """Return ID of the component matching name and attributes
+
+        Component having exactly the requested attributes is preferred,
+        otherwise the first component the attributes are a subset of is
+        returned.
+
+        :returns: Component ID or None
+        """
+        candidates = sorted(self.match(attributes, name))
+        for component_id in candidates:
+            if self.components[component_id] == attributes:
+                return component_id
+        return candidates[0] if candidates else None
+
+    def count(self, attributes):
+        """Return number of components having all given attributes"""
+        return len(self.match(attributes))
+
+
+def get_catalog_version():
+    return cache.get(CATALOG_VERSION_CACHE_KEY)
+
+
+def bump_catalog_version():
+    """Notify all workers that the component catalog has changed"""
+    drop_index()
+    cache.set(CATALOG_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=0)
+
+
+def drop_index():
+    """Drop the outdated component index of the current worker"""
+    current_app.extensions.pop("component_index", None)
+
+
+def get_index(loader):
+    """Return the component index of the current worker
+
+    :param callable loader: Function returning index rows, invoked when the
+        index needs to be (re)built.
+    """
+    version = get_catalog_version()
+    now = time.monotonic()
+    cached = current_app.extensions.get("component_index")
+    if cached is None or cached[0] != version or now >= cached[1]:
+        # Timeout 0 keeps the index like it keeps cache entries
+        timeout = current_app.config["CACHE_VIEW_TIMEOUT"] or float("inf")
+        cached = (version, now + timeout, ComponentIndex(loader()))
+        current_app.extensions["component_index"] = cached
+    return cached[2]
+
+
+def _is_catalog_modified(obj):
+    if getattr(obj, "__tablename__", None) not in CATALOG_TABLES:
+        return False
+    return any(
+        attr.history.has_changes()
+        for attr in inspect(obj).attrs
+        if attr.key not in IGNORED_RELATIONS
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _track_catalog_changes(session, flush_context):
+    if any(
+        getattr(obj, "__tablename__", None) in CATALOG_TABLES
+        for obj in itertools.chain(session.new, session.deleted)
+    ) or any(_is_catalog_modified(obj) for obj in session.dirty):
+        session.info["catalog_changed"] = True
+        if has_app_context():
+            drop_index()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_catalog_changes(session):
+    if session.info.pop("catalog_changed", False) and has_app_context():
+        bump_catalog_version()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_changes(session):
+    if session.info.pop("catalog_changed", False) and has_app_context():
+        drop_index()
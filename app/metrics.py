@@ -0,0 +1,234 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Prometheus metrics
+
+Request latency, SQL queries and their time per request, cache operations
+per key family and incident writes per action are exposed at `/metrics`.
+With multiple worker processes the metrics are aggregated over all of them
+when the `PROMETHEUS_MULTIPROC_DIR` environment variable points to a
+directory shared by the workers.
+"""
+import itertools
+import os
+import time
+
+from app.datetime import naive_utcnow
+from app.queries import get_request_stats
+
+from flask import Response
+from flask import g
+from flask import request
+
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import CollectorRegistry
+from prometheus_client import Counter
+from prometheus_client import Histogram
+from prometheus_client import REGISTRY
+from prometheus_client import generate_latest
+from prometheus_client import multiprocess
+
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+
+REQUEST_LATENCY = Histogram(
+    "sdb_request_duration_seconds",
+    "Request latency",
+    ["method", "endpoint"],
+)
+REQUESTS = Counter(
+    "sdb_requests_total",
+    "Requests",
+    ["method", "endpoint", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "sdb_request_db_queries",
+    "SQL queries per request",
+    ["endpoint"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+REQUEST_QUERY_TIME = Histogram(
+    "sdb_request_db_duration_seconds",
+    "Time spent in SQL queries per request",
+    ["endpoint"],
+)
+CACHE_OPERATIONS = Counter(
+    "sdb_cache_operations_total",
+    "Cache operations",
+    ["family", "result"],
+)
+INCIDENT_WRITES = Counter(
+    "sdb_incident_writes_total",
+    "Committed incident changes",
+    ["action"],
+)
+
+# Cache key prefix -> family
+CACHE_KEY_FAMILIES = (
+    ("component_status:", "component_status"),
+    ("incidents:", "api_incidents"),
+    ("/index", "index"),
+    ("/incidents/", "incident"),
+    ("/history", "history"),
+    ("/availability", "availability"),
+    ("dashboard_snapshot", "snapshot"),
+    ("_template_fragment_cache_", "fragment"),
+    ("data_generation", "generation"),
+    ("catalog_version", "catalog"),
+    ("outage_index", "outage_index"),
+    ("coalescing:", "coalescing"),
+    ("ingestion_job:", "ingestion_job"),
+)
+
+
+def get_key_family(key):
+    """Return the family of the cache key"""
+    for prefix, family in CACHE_KEY_FAMILIES:
+        if key.startswith(prefix):
+            return family
+    return "other"
+
+
+class InstrumentedCache:
+    """Cache backend proxy counting hits, misses and sets per key family"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def _count_get(self, key, value):
+        CACHE_OPERATIONS.labels(
+            get_key_family(key), "miss" if value is None else "hit"
+        ).inc()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        self._count_get(key, value)
+        return value
+
+    def get_many(self, *keys):
+        values = self.backend.get_many(*keys)
+        for key, value in zip(keys, values):
+            self._count_get(key, value)
+        return values
+
+    def get_dict(self, *keys):
+        return dict(zip(keys, self.get_many(*keys)))
+
+    def set(self, key, value, timeout=None):
+        CACHE_OPERATIONS.labels(get_key_family(key), "set").inc()
+        return self.backend.set(key, value, timeout=timeout)
+
+    def add(self, key, value, timeout=None):
+        CACHE_OPERATIONS.labels(get_key_family(key), "set").inc()
+        return self.backend.add(key, value, timeout=timeout)
+
+    def set_many(self, mapping, timeout=None):
+        for key in mapping:
+            CACHE_OPERATIONS.labels(get_key_family(key), "set").inc()
+        return self.backend.set_many(mapping, timeout=timeout)
+
+
+def _get_endpoint():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _finish_request(response):
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return response
+    endpoint = _get_endpoint()
+    REQUEST_LATENCY.labels(request.method, endpoint).observe(
+        time.perf_counter() - start
+    )
+    REQUESTS.labels(request.method, endpoint, response.status_code).inc()
+    stats = get_request_stats()
+    if stats is not None:
+        REQUEST_QUERIES.labels(endpoint).observe(stats.count)
+        REQUEST_QUERY_TIME.labels(endpoint).observe(stats.duration)
+    return response
+
+
+def metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app, cache):
+    """Collect metrics of the application and expose them at `/metrics`
+
+    :param app: Flask application.
+    :param cache: `flask_caching.Cache` to count operations of.
+    """
+    if not app.config["METRICS_ENABLED"]:
+        return
+    backends = app.extensions["cache"]
+    if not isinstance(backends[cache], InstrumentedCache):
+        backends[cache] = InstrumentedCache(backends[cache])
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_incident_writes(session, flush_context):
+    writes = session.info.setdefault("incident_writes", [])
+    opened = set()
+    attached = set()
+    removed = set()
+    for obj in itertools.chain(session.new, session.dirty):
+        if getattr(obj, "__tablename__", None) != "incident":
+            continue
+        if obj in session.new:
+            writes.append("open")
+            opened.update(comp.id for comp in obj.components)
+            continue
+        attrs = inspect(obj).attrs
+        if (
+            attrs.end_date.history.added
+            and obj.end_date is not None
+            and obj.end_date <= naive_utcnow()
+        ):
+            writes.append("close")
+        if attrs.impact.history.has_changes():
+            writes.append("impact_change")
+        history = attrs.components.history
+        attached.update(comp.id for comp in history.added or ())
+        removed.update(comp.id for comp in history.deleted or ())
+    # Components removed from one incident and added to another one (new or
+    # existing) are moved
+    moved = removed & (opened | attached)
+    writes.extend(["move"] * len(moved))
+    writes.extend(["attach"] * len(attached - moved))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_incident_writes(session):
+    for action in session.info.pop("incident_writes", ()):
+        INCIDENT_WRITES.labels(action).inc()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_incident_writes(session):
+    session.info.pop("incident_writes", None)
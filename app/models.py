@@ -11,38 +11,89 @@
 # under the License.
 #
 
+import itertools
 from datetime import datetime
 from typing import List
 
+from app import cache
 from app import db
+from app import lookup
+from app.availability import OutageIndex
+from app.availability import OutageMatrix
+from app.availability import last_months
+from app.availability import month_availability
+from app.availability import month_start
 from app.datetime import naive_utcnow
+from app.generation import mark_data_changed
+from app.generation import versioned_key
 
-from dateutil.relativedelta import relativedelta
+from flask import current_app
 
 from sqlalchemy import Boolean
 from sqlalchemy import Column
+from sqlalchemy import Float
 from sqlalchemy import ForeignKey
 from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import Table
+from sqlalchemy import and_
+from sqlalchemy import delete
+from sqlalchemy import extract
+from sqlalchemy import func
+from sqlalchemy import insert
 from sqlalchemy import or_
 from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import PropComparator
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm import selectinload
 from sqlalchemy.orm import with_loader_criteria
 
 
+OUTAGE_INDEX_CACHE_KEY = "outage_index"
+# Key of the PostgreSQL advisory lock serializing incident writers
+INCIDENT_LOCK_KEY = 0x5DB1
+# Name of the `WriteLock` row serializing incident writers elsewhere
+INCIDENT_LOCK_NAME = "incident"
+
+
 class Base(DeclarativeBase):
     """Base declarative class"""
 
     pass
 
 
+def reserve_ids(model, count):
+    """Return range of IDs for `count` rows of the model inserted in bulk
+
+    Explicit IDs save returning generated ones, which some backends do only
+    row by row. `sync_id_sequence` must be invoked once they are inserted.
+    """
+    first_id = (db.session.scalar(select(func.max(model.id))) or 0) + 1
+    return range(first_id, first_id + count)
+
+
+def sync_id_sequence(model):
+    """Advance the ID sequence of the model past explicitly inserted IDs"""
+    # Only PostgreSQL sequences are not aware of them
+    if db.session.get_bind().dialect.name != "postgresql":
+        return
+    db.session.execute(
+        select(
+            func.setval(
+                func.pg_get_serial_sequence(model.__tablename__, "id"),
+                select(func.max(model.id)).scalar_subquery(),
+            )
+        )
+    )
+
+
 """Incident to Component relation"""
 IncidentComponentRelation = Table(
     "incident_component_relation",
@@ -60,6 +111,8 @@ class Component(Base):
 
     id = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String())
+    # Components removed from the catalog are kept for the incident history
+    retired: Mapped[bool] = mapped_column(Boolean, default=False)
     attributes: Mapped[List["ComponentAttribute"]] = relationship(
         back_populates="component"
     )
@@ -78,10 +131,11 @@ class Component(Base):
 
     @staticmethod
     def all():
-        """Query all components with attributes"""
+        """Query all components in the catalog with attributes"""
         return (
             db.session.scalars(
                 select(Component)
+                .where(Component.retired.is_(False))
                 .options(joinedload(Component.attributes))
                 .order_by(Component.name)
             )
@@ -90,133 +144,201 @@ class Component(Base):
         )
 
     @staticmethod
-    def all_with_active_incidents():
-        """Query all components joined with active incidents for the component
+    def with_incidents(name="", component_ids=None):
+        """Query components in the catalog with their incidents
 
-        :returns: Components with attributes and incidents populated
+        :param str name: Component name prefix.
+        :param list component_ids: IDs of the components, all when not given.
+
+        :returns: List of `Component`s sorted by id with attributes,
+            incidents and their updates populated
         """
-        return (
-            db.session.scalars(
-                select(Component)
-                .options(joinedload(Component.attributes, innerjoin=True))
-                .options(
-                    joinedload(Component.incidents, innerjoin=False),
-                    with_loader_criteria(
-                        Incident,
-                        PropComparator.and_(
-                            or_(
-                                Incident.end_date.is_(None),
-                                Incident.end_date > naive_utcnow(),
-                            ),
-                            Incident.start_date <= naive_utcnow(),
-                        ),
-                    ),
-                )
-                .order_by(Component.name)
+        query = (
+            select(Component)
+            .where(Component.retired.is_(False))
+            .options(
+                selectinload(Component.attributes),
+                selectinload(Component.incidents).selectinload(
+                    Incident.updates
+                ),
             )
-            .unique()
-            .all()
+            .order_by(Component.id)
         )
+        if name:
+            query = query.where(Component.name.startswith(name))
+        if component_ids is not None:
+            query = query.where(Component.id.in_(component_ids))
+        return db.session.scalars(query).all()
+
+    @staticmethod
+    def get_region_category_tree(components=None):
+        """Group components into region -> category -> components tree
+
+        :param list components: Components with attributes populated. All
+            components are loaded with a single query when not given.
+
+        :returns: List of dictionaries with `region` and `categories` keys,
+            sorted by region. Every category is a dictionary with `name`,
+            `rowspan` and `components` (sorted by name) keys. Components
+            missing region or category attribute are skipped.
+        """
+        if components is None:
+            components = Component.all()
+        tree = {}
+        for comp in components:
+            attrs = comp.get_attributes_as_dict()
+            if "region" not in attrs or "category" not in attrs:
+                continue
+            tree.setdefault(attrs["region"], {}).setdefault(
+                attrs["category"], []
+            ).append(comp)
+        return [
+            {
+                "region": region,
+                "categories": [
+                    {
+                        "name": category,
+                        "rowspan": len(category_components),
+                        "components": sorted(
+                            category_components, key=lambda c: c.name
+                        ),
+                    }
+                    for category, category_components in sorted(
+                        categories.items()
+                    )
+                ],
+            }
+            for region, categories in sorted(tree.items())
+        ]
 
     def get_attributes_as_dict(self):
         """Return component attributes as dicionary"""
         return {attr.name: attr.value for attr in self.attributes}
 
     @staticmethod
-    def count_components_by_attributes(attr_dict):
-        """Return the number of components that match specific attributes"""
-        counter = 0
-        for comp in Component.all():
-            comp_attrs = comp.get_attributes_as_dict()
-            if set(comp_attrs.items()).intersection(
-                set(attr_dict.items())
-            ) == set(attr_dict.items()):
-                counter += 1
-        return counter
+    def get_index():
+        """Return in-memory lookup index of components
+
+        :returns: `app.lookup.ComponentIndex`
+        """
+        return lookup.get_index(
+            lambda: db.session.execute(
+                select(
+                    Component.id,
+                    Component.name,
+                    ComponentAttribute.name,
+                    ComponentAttribute.value,
+                )
+                .outerjoin(
+                    ComponentAttribute,
+                    ComponentAttribute.component_id == Component.id,
+                )
+                .where(Component.retired.is_(False))
+            ).all()
+        )
+
+    @staticmethod
+    def find_id(name, attributes):
+        """Find ID of the component matching name and set of attributes
+
+        Perform lookup in the component index. Components added by processes
+        not sharing the cache backend are missing in the index until it
+        expires, therefore misses are looked up in the database, and the
+        index is dropped when the component is found there.
+
+        :param str name: Component name.
+        :param dict attributes: Attributes as dictionary
+
+        :returns: Component ID when found, None otherwise
+        """
+        component_id = Component.get_index().find(name, attributes)
+        if component_id is None:
+            component = Component._find_in_db(name, attributes)
+            if component is not None:
+                lookup.drop_index()
+                component_id = component.id
+        return component_id
+
+    @staticmethod
+    def _find_in_db(name, attributes):
+        candidates = Component.search(name, attributes)
+        for comp in candidates:
+            if comp.get_attributes_as_dict() == attributes:
+                return comp
+        return candidates[0] if candidates else None
 
     @staticmethod
     def find_by_name_and_attributes(name, attributes):
         """Find existing component by name and set of attributes
 
-        Perform lookup and search for all components matching target name. For
-        the results compare their attributes. When there is a full match -
-        return it. Otherwise compare whether target attributes build a subset
-        of existing component.
+        Perform lookup for all components matching target name and having
+        all target attributes. When there is a full match - return it.
+        Otherwise return the first component target attributes build a
+        subset of. Components retired since the index has been built are
+        not returned.
 
         :param str name: Component name.
         :param dict attributes: Attributes as dictionary
 
         :returns: `Component` entity when found, None otherwise
         """
-        comps_by_name = db.session.scalars(
-            select(Component).where(Component.name == name)
-        ).all()
-        for comp in comps_by_name:
-            comp_attrs = comp.get_attributes_as_dict()
-            if comp_attrs == attributes:
-                # Shortcut - just return
-                return comp
-            if all(
-                comp_attrs.get(key, None) == val
-                for key, val in attributes.items()
-            ):
-                # Target attributes build a subset of current attributes -
-                # a pretty good candidate when not much attributes were passed
-                return comp
-        return None
+        component_id = Component.find_id(name, attributes)
+        if component_id is None:
+            return None
+        component = db.session.get(Component, component_id)
+        if component is None or component.retired:
+            lookup.drop_index()
+            component = Component._find_in_db(name, attributes)
+        return component
+
+    @staticmethod
+    def search(name=None, attributes=None):
+        """Find components by name and attributes
+
+        :param str name: Component name. All names when not given.
+        :param dict attributes: Attributes the components must have.
+
+        :returns: List of `Component`s with attributes populated
+        """
+        query = (
+            select(Component)
+            .where(Component.retired.is_(False))
+            .options(selectinload(Component.attributes))
+            .order_by(Component.name, Component.id)
+        )
+        if name:
+            query = query.where(Component.name == name)
+        for key, val in (attributes or {}).items():
+            query = query.where(
+                Component.attributes.any(
+                    and_(
+                        ComponentAttribute.name == key,
+                        ComponentAttribute.value == val,
+                    )
+                )
+            )
+        return db.session.scalars(query).all()
 
     def calculate_sla(self):
         """Calculate component availability on the month basis"""
 
         time_now = naive_utcnow()
-        this_month_start = datetime(time_now.year, time_now.month, 1)
+        months = last_months(time_now, 6)
 
         outages = [
             inc
             for inc in self.incidents
             if inc.impact == 3 and inc.end_date is not None
         ]
-        outages_dict = Incident.get_history_by_months(outages)
-        outages_dict_sorted = dict(sorted(outages_dict.items()))
-
-        prev_month_minutes = 0
-
-        months = [
-            this_month_start + relativedelta(months=-mon) for mon in range(6)
-        ]
-        sla_dict = {month: 1 for month in months}
-
-        for month_start, outage_group in outages_dict_sorted.items():
-            if month_start in months:
-                minutes_in_month = prev_month_minutes
-                outages_minutes = 0
-                prev_month_minutes = 0
-
-                if this_month_start.month == month_start.month:
-                    minutes_in_month = (
-                        time_now - month_start
-                    ).total_seconds() / 60
-                else:
-                    next_month_start = month_start + relativedelta(months=1)
-                    minutes_in_month = (
-                        next_month_start - month_start
-                    ).total_seconds() / 60
-
-                for outage in outage_group:
-                    outage_start = outage.start_date
-                    if outage_start < month_start:
-                        diff = month_start - outage_start
-                        prev_month_minutes += diff.total_seconds() / 60
-                        outage_start = month_start
-
-                    diff = outage.end_date - outage_start
-                    outages_minutes += diff.total_seconds() / 60
-
-                sla_dict[month_start] = (
-                    minutes_in_month - outages_minutes
-                ) / minutes_in_month
-
-        return sla_dict
+        matrix = OutageMatrix.build(
+            [self.id] * len(outages),
+            [outage.start_date for outage in outages],
+            [outage.end_date for outage in outages],
+            months,
+        )
+        return matrix.availability(time_now).get(
+            self.id, {month: 1 for month in months}
+        )
 
     @staticmethod
     def get_by_id(component_id):
@@ -224,13 +346,22 @@ class Component(Base):
             select(Component).where(Component.id == component_id)
         ).first()
 
-    def planned_maintenance(self):
-        """Return a planned maintenance for
-        this component"""
+    @staticmethod
+    def get_by_ids(component_ids):
+        """Return components with attributes by IDs using a single query
 
-        for planned in Incident.get_planned_maintenances():
-            if self in planned.components:
-                return planned
+        :returns: Dictionary of component ID -> `Component`, retired
+            components are skipped
+        """
+        return {
+            comp.id: comp
+            for comp in db.session.scalars(
+                select(Component)
+                .where(Component.id.in_(component_ids))
+                .where(Component.retired.is_(False))
+                .options(selectinload(Component.attributes))
+            )
+        }
 
 
 class ComponentAttribute(Base):
@@ -275,7 +406,7 @@ class Incident(Base):
     start_date: Mapped[datetime] = mapped_column(
         db.DateTime, insert_default=naive_utcnow()
     )
-    end_date: Mapped[datetime] = mapped_column(nullable=True)
+    end_date: Mapped[datetime] = mapped_column(nullable=True, index=True)
     impact: Mapped[int] = mapped_column(db.SmallInteger)
     system: Mapped[bool] = mapped_column(Boolean, default=False)
 
@@ -292,84 +423,291 @@ class Incident(Base):
         return "<Incident {}: {}>".format(self.id, self.text)
 
     @staticmethod
-    def get_all_active():
-        """Return active incidents and maintenances"""
-        return db.session.scalars(
-            select(Incident).filter(
+    def details_options():
+        """Loader options populating components and updates of incidents"""
+        return (
+            selectinload(Incident.components).selectinload(
+                Component.attributes
+            ),
+            selectinload(Incident.updates),
+        )
+
+    @staticmethod
+    def lock():
+        """Serialize incident writers until the end of the transaction
+
+        Decisions based on the active incidents (e.g. whether a new incident
+        must be opened) must not interleave between workers. On PostgreSQL
+        a transaction level advisory lock is taken, on SQLite the
+        transaction is started with `BEGIN IMMEDIATE` (acquiring the write
+        lock of the database). Other databases lock a `WriteLock` row, which
+        exists even when no incident is open.
+        """
+        connection = db.session.connection()
+        dialect = connection.dialect.name
+        if dialect == "postgresql":
+            connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": INCIDENT_LOCK_KEY},
+            )
+        elif dialect == "sqlite":
+            if not connection.connection.driver_connection.in_transaction:
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            WriteLock.acquire(INCIDENT_LOCK_NAME)
+
+    @staticmethod
+    def get_all_active(with_details=False):
+        """Return active incidents and maintenances
+
+        :param bool with_details: Eagerly load components with attributes
+            and updates of the incidents.
+        """
+        query = select(Incident).filter(
+            or_(
+                Incident.end_date.is_(None),
+                Incident.end_date > naive_utcnow(),
+            ),
+            Incident.start_date <= naive_utcnow(),
+        )
+        if with_details:
+            query = query.options(*Incident.details_options())
+        return db.session.scalars(query).all()
+
+    @staticmethod
+    def search(
+        limit,
+        after_id=None,
+        active=None,
+        impact=None,
+        system=None,
+        start_after=None,
+        end_before=None,
+        component_id=None,
+        region=None,
+    ):
+        """Return a page of incidents ordered by ID
+
+        All filters are applied in the database, updates of the returned
+        incidents are loaded with one additional query.
+
+        :param int limit: Maximal number of incidents to return.
+        :param int after_id: Only return incidents with greater ID (cursor
+            of the previous page).
+        :param bool active: Only return active (or only inactive) incidents.
+        :param int impact: Incident impact.
+        :param bool system: Only return incidents opened by the system (or
+            only those opened by humans).
+        :param datetime start_after: Minimal start date.
+        :param datetime end_before: Maximal end date.
+        :param int component_id: Affected component.
+        :param str region: Region of any affected component.
+
+        :returns: List of `Incident`
+        """
+        query = select(Incident).options(selectinload(Incident.updates))
+        if after_id is not None:
+            query = query.where(Incident.id > after_id)
+        if active is not None:
+            time_now = naive_utcnow()
+            is_active = and_(
+                Incident.start_date <= time_now,
                 or_(
                     Incident.end_date.is_(None),
-                    Incident.end_date > naive_utcnow(),
+                    Incident.end_date > time_now,
                 ),
-                Incident.start_date <= naive_utcnow(),
             )
+            query = query.where(is_active if active else ~is_active)
+        if impact is not None:
+            query = query.where(Incident.impact == impact)
+        if system is not None:
+            query = query.where(Incident.system.is_(system))
+        if start_after is not None:
+            query = query.where(Incident.start_date >= start_after)
+        if end_before is not None:
+            query = query.where(Incident.end_date <= end_before)
+        if component_id is not None:
+            query = query.where(
+                Incident.components.any(Component.id == component_id)
+            )
+        if region is not None:
+            query = query.where(
+                Incident.components.any(
+                    Component.attributes.any(
+                        and_(
+                            ComponentAttribute.name == "region",
+                            ComponentAttribute.value == region,
+                        )
+                    )
+                )
+            )
+        return db.session.scalars(
+            query.order_by(Incident.id.asc()).limit(limit)
         ).all()
 
     @staticmethod
-    def get_all_closed():
-        """Return closed incidents and maintenances"""
+    def iter_all(chunk_size=500):
+        """Iterate over all incidents ordered by ID
+
+        Incidents are fetched from a server side cursor in chunks of
+        `chunk_size`, components and updates are loaded per chunk.
+
+        :returns: Iterator of `Incident`
+        """
         return db.session.scalars(
-            select(Incident).filter(
-                Incident.end_date.is_not(None),
-                Incident.end_date < naive_utcnow(),
-            )
-        ).all()
+            select(Incident)
+            .options(*Incident.details_options())
+            .order_by(Incident.id.asc())
+            .execution_options(yield_per=chunk_size)
+        )
 
     @staticmethod
-    def get_history_by_months(incident_list):
-        if incident_list is None:
-            incident_list = Incident.get_all_closed()
-        incident_dict = {}
-        for incident in incident_list:
-            incident_dict.setdefault(
-                datetime(incident.end_date.year, incident.end_date.month, 1),
-                [],
-            ).append(incident)
-        return incident_dict
+    def get_history(before=None, months=3):
+        """Return a page of closed incidents grouped by month of their end
+
+        The page covers `months` calendar months up to the latest month with
+        incidents ending before `before`. Only incidents of the page are
+        loaded, ordered by month of their end in SQL.
+
+        :param datetime before: Only incidents ending before this date.
+        :param int months: Number of months of the page.
+
+        :returns: Tuple of (list of (month start, list of incidents) newest
+            first, start of the last month of the page when there are older
+            incidents or None)
+        """
+        closed = [
+            Incident.end_date.is_not(None),
+            Incident.end_date < naive_utcnow(),
+        ]
+        if before is not None:
+            closed.append(Incident.end_date < before)
+        latest = db.session.scalar(
+            select(func.max(Incident.end_date)).where(*closed)
+        )
+        if latest is None:
+            return [], None
+        first_month = last_months(latest, months)[-1]
+        end_year = extract("year", Incident.end_date)
+        end_month = extract("month", Incident.end_date)
+        incidents = db.session.scalars(
+            select(Incident)
+            .where(*closed, Incident.end_date >= first_month)
+            .order_by(
+                end_year.desc(), end_month.desc(), Incident.start_date.desc()
+            )
+        )
+        history = [
+            (month_start(month_incidents[0].end_date), month_incidents)
+            for month_incidents in (
+                list(group)
+                for _, group in itertools.groupby(
+                    incidents,
+                    key=lambda inc: (inc.end_date.year, inc.end_date.month),
+                )
+            )
+        ]
+        older = db.session.scalar(
+            select(Incident.id)
+            .where(*closed, Incident.end_date < first_month)
+            .limit(1)
+        )
+        return history, first_month if older is not None else None
 
     @staticmethod
-    def get_active_maintenance():
-        """Return active maintenances
+    def get_outage_intervals(component_ids=None):
+        """Return closed outages of components as parallel lists
+
+        All intervals are fetched with a single query to be processed by
+        the availability engine in one batch.
+
+        :param list component_ids: Limit result to the given components.
 
-        :returns: `Incident`
+        :returns: Tuple of (component ids, start dates, end dates)
         """
-        return db.session.scalars(
-            select(Incident).filter(
-                # already started
-                Incident.start_date <= naive_utcnow(),
-                # not closed
-                or_(
-                    Incident.end_date.is_(None),
-                    Incident.end_date > naive_utcnow(),
-                ),
-                Incident.impact == 0,
+        query = (
+            select(
+                IncidentComponentRelation.c.component_id,
+                Incident.start_date,
+                Incident.end_date,
             )
-        ).first()
+            .join(
+                Incident,
+                Incident.id == IncidentComponentRelation.c.incident_id,
+            )
+            .where(Incident.impact == 3, Incident.end_date.is_not(None))
+        )
+        if component_ids is not None:
+            query = query.where(
+                IncidentComponentRelation.c.component_id.in_(component_ids)
+            )
+        components = []
+        starts = []
+        ends = []
+        for component_id, start, end in db.session.execute(query):
+            components.append(component_id)
+            starts.append(start)
+            ends.append(end)
+        return components, starts, ends
 
     @staticmethod
-    def get_planned_maintenances():
-        """Return planned maintenances"""
-        return db.session.scalars(
-            select(Incident).filter(
-                Incident.start_date > naive_utcnow(),
-                Incident.impact == 0,
+    def get_outage_index():
+        """Return interval index of closed outages
+
+        The index is cached for the current data generation, so that it is
+        rebuilt after changes of the incidents have been committed.
+
+        :returns: `OutageIndex`
+        """
+        cache_key = versioned_key(OUTAGE_INDEX_CACHE_KEY)
+        index = cache.get(cache_key)
+        if index is None:
+            index = OutageIndex(*Incident.get_outage_intervals())
+            cache.set(
+                cache_key,
+                index,
+                timeout=current_app.config["CACHE_VIEW_TIMEOUT"],
             )
-        ).all()
+        return index
 
     @staticmethod
-    def get_active_m():
-        """Return active manually opened incidents
-        :returns: `Incident`s created by USER
+    def get_planned_maintenances(with_details=False):
+        """Return planned maintenances
+
+        :param bool with_details: Eagerly load components with attributes
+            and updates of the maintenances.
         """
-        return db.session.scalars(
-            select(Incident).filter(
-                # already started
-                Incident.start_date <= naive_utcnow(),
-                # not closed
-                Incident.end_date.is_(None),
-                Incident.impact != 0,
-                Incident.system.is_(False),
+        query = select(Incident).filter(
+            Incident.start_date > naive_utcnow(),
+            Incident.impact == 0,
+        )
+        if with_details:
+            query = query.options(*Incident.details_options())
+        return db.session.scalars(query).all()
+
+    @staticmethod
+    def get_next_change(time_now):
+        """Return the nearest moment the set of active incidents changes
+
+        That is the nearest start of any incident or maintenance planned
+        ahead, or the nearest end date of any of them, looked up with a
+        single query.
+
+        :returns: `datetime` or None when no incident starts or ends after
+            `time_now`
+        """
+        moments = db.session.execute(
+            select(
+                select(func.min(Incident.start_date))
+                .where(Incident.start_date > time_now)
+                .scalar_subquery(),
+                select(func.min(Incident.end_date))
+                .where(Incident.end_date > time_now)
+                .scalar_subquery(),
             )
-        ).all()
+        ).one()
+        moments = [moment for moment in moments if moment is not None]
+        return min(moments) if moments else None
 
     @staticmethod
     def get_active():
@@ -388,10 +726,28 @@ class Incident(Base):
         ).all()
 
     @staticmethod
-    def get_by_id(incident_id):
+    def get_by_ids(incident_ids):
+        """Return incidents with updates by IDs using a single query
+
+        :returns: List of `Incident`
+        """
         return db.session.scalars(
-            select(Incident).where(Incident.id == incident_id)
-        ).first()
+            select(Incident)
+            .where(Incident.id.in_(incident_ids))
+            .options(selectinload(Incident.updates))
+        ).all()
+
+    @staticmethod
+    def get_by_id(incident_id, with_details=False):
+        """Return incident by ID
+
+        :param bool with_details: Eagerly load components with attributes
+            and updates of the incident.
+        """
+        query = select(Incident).where(Incident.id == incident_id)
+        if with_details:
+            query = query.options(*Incident.details_options())
+        return db.session.scalars(query).first()
 
     def get_attributes_by_key(self, attr_key):
         """Get Incident component attribute by key"""
@@ -400,6 +756,27 @@ class Incident(Base):
             for c in self.components
         )
 
+    @staticmethod
+    def get_latest_by_component(component_id, limit):
+        """Return latest incidents of the component with their updates
+
+        :param int component_id: ID of the component.
+        :param int limit: Maximal number of incidents.
+
+        :returns: List of `Incident`, newest first
+        """
+        return db.session.scalars(
+            select(Incident)
+            .join(
+                IncidentComponentRelation,
+                IncidentComponentRelation.c.incident_id == Incident.id,
+            )
+            .where(IncidentComponentRelation.c.component_id == component_id)
+            .options(selectinload(Incident.updates))
+            .order_by(Incident.id.desc())
+            .limit(limit)
+        ).all()
+
     @staticmethod
     def get_view_by_component_attribute(attr_name, attr_value):
         """Get Incidents view by component attribute"""
@@ -444,3 +821,133 @@ class IncidentStatus(Base):
     )
     text: Mapped[str] = mapped_column(String())
     status: Mapped[str] = mapped_column(String())
+
+
+class ComponentSlaMonth(Base):
+    """Monthly component outage rollup
+
+    Keeps the amount of outage minutes per component and calendar month,
+    so that availability does not need to be recalculated from the whole
+    incident history on every render.
+    """
+
+    __tablename__ = "component_sla_month"
+    component_id = mapped_column(
+        ForeignKey("component.id"), primary_key=True
+    )
+    month: Mapped[datetime] = mapped_column(db.DateTime, primary_key=True)
+    outage_minutes: Mapped[float] = mapped_column(Float, default=0)
+
+    def __repr__(self):
+        return "<ComponentSlaMonth {}: {} ({})>".format(
+            self.component_id, self.month, self.outage_minutes
+        )
+
+    @staticmethod
+    def update_components(component_ids=None):
+        """Recalculate the rollup for the given components
+
+        Changes are only added to the session, committing them is up to
+        the caller.
+
+        :param list component_ids: Component IDs to recalculate. All
+            components are recalculated when None.
+        """
+        cleanup = delete(ComponentSlaMonth)
+        if component_ids is not None:
+            component_ids = list(component_ids)
+            if not component_ids:
+                return
+            cleanup = cleanup.where(
+                ComponentSlaMonth.component_id.in_(component_ids)
+            )
+
+        matrix = OutageMatrix.build(
+            *Incident.get_outage_intervals(component_ids)
+        )
+        rows = [
+            {
+                "component_id": component_id,
+                "month": month,
+                "outage_minutes": minutes,
+            }
+            for component_id, month, minutes in matrix.items()
+        ]
+        db.session.execute(cleanup)
+        if rows:
+            db.session.execute(insert(ComponentSlaMonth), rows)
+        # Cached views and the outage index are invalidated on commit
+        mark_data_changed(db.session)
+
+    @staticmethod
+    def update_incident(incident, impact=None):
+        """Recalculate the rollup for components of the incident
+
+        Only outages are taken into account, therefore nothing is done
+        unless the incident is (or, with `impact`, was) an outage.
+
+        :param Incident incident: Changed incident.
+        :param int impact: Impact of the incident before the change.
+        """
+        if int(incident.impact) != 3 and impact != 3:
+            return
+        ComponentSlaMonth.update_components(
+            [comp.id for comp in incident.components]
+        )
+
+    @staticmethod
+    def get_sla_by_months(months):
+        """Return availability of all components for given months
+
+        :param list months: Month starts (oldest first is not required).
+
+        :returns: Dictionary of component id -> {month: availability}.
+            Components without outages are not present in the result.
+        """
+        time_now = naive_utcnow()
+        sla = {}
+        for row in db.session.scalars(
+            select(ComponentSlaMonth).where(
+                ComponentSlaMonth.month.in_(months)
+            )
+        ):
+            sla.setdefault(
+                row.component_id, {month: 1 for month in months}
+            )[row.month] = month_availability(
+                row.month, row.outage_minutes, time_now
+            )
+        return sla
+
+
+class WriteLock(Base):
+    """Rows locked to serialize writers
+
+    Used on databases without advisory locks, where locking the rows
+    about to be changed is not enough when they may not exist yet.
+    """
+
+    __tablename__ = "write_lock"
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    @staticmethod
+    def acquire(name):
+        """Lock the row until the end of the transaction
+
+        The row is created on first use.
+
+        :param str name: Name of the lock.
+        """
+        query = (
+            select(WriteLock.name)
+            .where(WriteLock.name == name)
+            .with_for_update()
+        )
+        if db.session.execute(query).first() is not None:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(WriteLock).values(name=name))
+        except IntegrityError:
+            # Created by a concurrent writer meanwhile
+            pass
+        db.session.execute(query)
@@ -0,0 +1,141 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Tracking of SQL queries
+
+Queries are counted, timed and fingerprinted per request. Statements issued
+repeatedly within a request (typically lazy loads of a relationship in a
+loop) are logged as N+1 suspects and requests exceeding the configured
+query budget are logged too. `track_queries` collects the same data for any
+block of code, e.g. in tests.
+"""
+import collections
+import contextlib
+import re
+import threading
+import time
+
+from flask import current_app
+from flask import g
+from flask import has_request_context
+from flask import request
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Lists of positional (sqlite) or named (postgresql) parameters
+PARAMETER_LIST = re.compile(r"\((?:\?|%\(\w+\)s)(?:, (?:\?|%\(\w+\)s))*\)")
+
+_local = threading.local()
+
+
+class QueryStats:
+    """Queries issued within a request or a `track_queries` block"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Statement fingerprint -> number of executions
+        self.statements = collections.Counter()
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """Return list of (fingerprint, count) issued at least `threshold`
+        times, most frequent first
+        """
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def fingerprint(statement):
+    """Return the statement with whitespace and lists of parameters
+    normalized, so that executions differing only in parameters match
+    """
+    statement = re.sub(r"\s+", " ", statement).strip()
+    return PARAMETER_LIST.sub("(...)", statement)
+
+
+def get_request_stats():
+    """Return `QueryStats` of the current request or None"""
+    if has_request_context():
+        return g.get("query_stats")
+    return None
+
+
+@contextlib.contextmanager
+def track_queries():
+    """Collect queries issued by the current thread within the block
+
+    :returns: `QueryStats`
+    """
+    if not hasattr(_local, "trackers"):
+        _local.trackers = []
+    stats = QueryStats()
+    _local.trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        _local.trackers.remove(stats)
+
+
+def _start_request():
+    g.query_stats = QueryStats()
+
+
+def _check_request(response):
+    stats = g.get("query_stats")
+    if stats is None:
+        return response
+    endpoint = request.url_rule.rule if request.url_rule else request.path
+    threshold = current_app.config["SQL_REPEATED_QUERY_THRESHOLD"]
+    if threshold:
+        for statement, count in stats.repeated(threshold):
+            current_app.logger.warning(
+                f"Possible N+1 queries in {request.method} {endpoint}: "
+                f"statement issued {count} times: {statement}"
+            )
+    budget = current_app.config["SQL_QUERY_BUDGET"]
+    if budget and stats.count > budget:
+        current_app.logger.warning(
+            f"{request.method} {endpoint} issued {stats.count} queries, "
+            f"more than the budget of {budget}"
+        )
+    return response
+
+
+def init_app(app):
+    """Track queries of every request of the application"""
+    app.before_request(_start_request)
+    app.after_request(_check_request)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _finish_query(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    stats = get_request_stats()
+    if stats is not None:
+        stats.add(statement, duration)
+    for tracker in getattr(_local, "trackers", ()):
+        tracker.add(statement, duration)
@@ -11,8 +11,8 @@
 # under the License.
 #
 
+from app.conditional import conditional
 from app.models import Component
-from app.models import ComponentAttribute
 from app.models import Incident
 from app.rss import bp
 
@@ -26,6 +26,7 @@ from markupsafe import escape
 
 
 @bp.route("/rss/")
+@conditional(time_dependent=True)
 def rss():
     region = request.args.get("mt", "")
     component_name = request.args.get("srv", "")
@@ -47,10 +48,9 @@ def rss():
         if not component:
             content = f"Component: {escape(component_name)} is not found"
             return make_response(escape(content), 404)
-        incidents = list(reversed(component.incidents[-10:]))
+        incidents = Incident.get_latest_by_component(component.id, 10)
     elif region:
-        supported_vals = ComponentAttribute.get_unique_values(attr_name)
-        if attr_value not in supported_vals:
+        if not Component.get_index().count(attribute):
             return make_response(
                 f"{escape(attr_value)} is not a supported region", 404
             )
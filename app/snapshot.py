@@ -0,0 +1,314 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Dashboard snapshot
+
+Current state of the dashboard (components grouped by region and category,
+their active incidents, planned maintenances and open incidents with their
+latest update) is built with a constant number of queries and shared
+through the cache backend by the workers rendering the index page. The
+snapshot is bound to the data generation, so it is rebuilt whenever
+incidents or components are written, and to the validity period of the
+current state, which is over when an incident or a maintenance starts or
+reaches its end date.
+
+Parts of the index page are cached as fragments keyed by versions of the
+data rendered in them, so that a change in one region only re-renders the
+tab of that region.
+"""
+import hashlib
+
+from app import cache
+from app.datetime import naive_utcnow
+from app.generation import versioned_key
+from app.models import Component
+from app.models import Incident
+
+from flask import current_app
+from flask import make_response
+
+from flask_caching import CachedResponse
+
+
+SNAPSHOT_CACHE_KEY = "dashboard_snapshot"
+VALIDITY_CACHE_KEY = "dashboard_validity"
+
+
+def _version(state):
+    return hashlib.sha1(repr(state).encode()).hexdigest()
+
+
+class UpdateView:
+    """Incident update as stored in the snapshot"""
+
+    def __init__(self, update):
+        self.status = update.status
+        self.text = update.text
+        self.timestamp = update.timestamp
+
+
+class AttributeView:
+    """Component attribute as stored in the snapshot"""
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class ComponentView:
+    """Component as stored in the snapshot"""
+
+    def __init__(self, component):
+        self.id = component.id
+        self.name = component.name
+        self._attributes = component.get_attributes_as_dict()
+        self.attributes = [
+            AttributeView(attr.name, attr.value)
+            for attr in component.attributes
+        ]
+        # Active incidents and maintenances affecting the component
+        self.incidents = []
+        # Incident to be displayed as the component status
+        self.incident = None
+        # Nearest planned maintenance
+        self.planned = None
+
+    def __repr__(self):
+        return "<ComponentView {}: {}>".format(self.id, self.name)
+
+    def state(self):
+        """Return everything rendered of the component"""
+        incident = self.incident
+        return (
+            self.id,
+            self.name,
+            (incident.id, incident.impact) if incident else None,
+            self.planned.id if self.planned else None,
+        )
+
+    def get_attributes_as_dict(self):
+        return self._attributes
+
+
+class IncidentView:
+    """Incident as stored in the snapshot"""
+
+    def __init__(self, incident, components):
+        self.id = incident.id
+        self.text = incident.text
+        self.impact = incident.impact
+        self.start_date = incident.start_date
+        self.end_date = incident.end_date
+        self.components = components
+        updates = [u for u in incident.updates if u.status != "description"]
+        descriptions = [
+            u for u in incident.updates if u.status == "description"
+        ]
+        self.latest_update = UpdateView(updates[0]) if updates else None
+        self.description = (
+            UpdateView(descriptions[0]) if descriptions else None
+        )
+
+    def __repr__(self):
+        return "<IncidentView {}: {}>".format(self.id, self.text)
+
+    def state(self):
+        """Return everything rendered of the incident"""
+        return (
+            self.id,
+            self.text,
+            self.impact,
+            self.start_date,
+            self.end_date,
+            [
+                (c.id, c.name, c.get_attributes_as_dict().get("region"))
+                for c in self.components
+            ],
+            [(u.status, u.text, u.timestamp) for u in self.updates],
+        )
+
+    @property
+    def updates(self):
+        return [u for u in (self.latest_update, self.description) if u]
+
+    def get_attributes_by_key(self, attr_key):
+        return set(
+            c.get_attributes_as_dict().get(attr_key) for c in self.components
+        )
+
+
+class DashboardSnapshot:
+    """Current state of the dashboard"""
+
+    def __init__(self, components, active, planned, time_now, valid_until):
+        self.built_at = time_now
+        # The snapshot must be rebuilt once any incident or maintenance
+        # starts or reaches its end date
+        self.valid_until = valid_until
+        self.components = {}
+        for comp in components:
+            self.components[comp.id] = ComponentView(comp)
+
+        self.incidents = []
+        self.maintenances = []
+        for inc in sorted(active, key=lambda i: i.start_date, reverse=True):
+            view = self._incident_view(inc)
+            if inc.impact == 0:
+                self.maintenances.append(view)
+            else:
+                self.incidents.append(view)
+            for comp in view.components:
+                comp.incidents.append(view)
+        for comp in self.components.values():
+            if comp.incidents:
+                comp.incident = Incident.get_prioritized_impact(
+                    comp.incidents
+                )
+
+        self.planned = []
+        for inc in sorted(planned, key=lambda i: (i.start_date, i.id)):
+            view = self._incident_view(inc)
+            self.planned.append(view)
+            for comp in view.components:
+                if comp.planned is None:
+                    comp.planned = view
+
+        self.tree = Component.get_region_category_tree(
+            list(self.components.values())
+        )
+        self.regions = sorted(
+            set(
+                comp.get_attributes_as_dict()["region"]
+                for comp in self.components.values()
+                if "region" in comp.get_attributes_as_dict()
+            )
+        )
+
+        # Versions of the page fragments
+        self.incidents_version = _version(
+            [inc.state() for inc in self.incidents]
+        )
+        self.maintenances_version = _version(
+            [inc.state() for inc in self.maintenances]
+        )
+        self.region_versions = {
+            node["region"]: _version(
+                [
+                    (cat["name"], [comp.state() for comp in cat["components"]])
+                    for cat in node["categories"]
+                ]
+            )
+            for node in self.tree
+        }
+
+    def _incident_view(self, incident):
+        return IncidentView(
+            incident,
+            [
+                self.components[comp.id]
+                for comp in incident.components
+                if comp.id in self.components
+            ],
+        )
+
+    @property
+    def active(self):
+        """All active incidents and maintenances"""
+        return self.incidents + self.maintenances
+
+    @staticmethod
+    def build(time_now, valid_until):
+        """Build the snapshot from the database
+
+        :param datetime time_now: Current time.
+        :param datetime valid_until: See `get_validity`.
+        """
+        return DashboardSnapshot(
+            Component.all(),
+            Incident.get_all_active(with_details=True),
+            Incident.get_planned_maintenances(with_details=True),
+            time_now,
+            valid_until,
+        )
+
+
+def get_validity(time_now=None):
+    """Return the period the current state of the dashboard is valid for
+
+    The period is kept under its own small cache key, so that conditional
+    requests and cache timeouts do not need the snapshot. It is looked up
+    with a single query when missing or over, and expires after
+    `CACHE_VIEW_TIMEOUT` seconds at most, which bounds the staleness of
+    entries derived from it when writes of other workers are not noticed.
+
+    :returns: Tuple of (since, until) `datetime`s, until is None when no
+        incident starts or ends later
+    """
+    if time_now is None:
+        time_now = naive_utcnow()
+    cache_key = versioned_key(VALIDITY_CACHE_KEY)
+    validity = cache.get(cache_key)
+    if validity is None or (
+        validity[1] is not None and time_now >= validity[1]
+    ):
+        validity = (time_now, Incident.get_next_change(time_now))
+        cache.set(
+            cache_key, validity, timeout=_get_timeout(validity[1], time_now)
+        )
+    return validity
+
+
+def get_snapshot():
+    """Return the current dashboard snapshot
+
+    The snapshot is taken from the cache and only built when missing or
+    when the period it has been built for is over.
+
+    :returns: `DashboardSnapshot`
+    """
+    time_now = naive_utcnow()
+    since, until = get_validity(time_now)
+    cache_key = versioned_key(
+        f"{SNAPSHOT_CACHE_KEY}:{since:%Y%m%d%H%M%S%f}"
+    )
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        snapshot = DashboardSnapshot.build(time_now, until)
+        cache.set(
+            cache_key, snapshot, timeout=_get_timeout(until, time_now)
+        )
+    return snapshot
+
+
+def _get_timeout(valid_until, time_now):
+    timeout = current_app.config["CACHE_VIEW_TIMEOUT"]
+    if valid_until:
+        remaining = max(int((valid_until - time_now).total_seconds()), 1)
+        # Timeout 0 keeps entries forever
+        timeout = min(timeout, remaining) if timeout else remaining
+    return timeout
+
+
+def get_cache_timeout(time_now=None):
+    """Return timeout for entries derived from the current state
+
+    Entries are cached for `CACHE_VIEW_TIMEOUT` seconds at most, but not
+    beyond the moment the current state becomes outdated.
+    """
+    if time_now is None:
+        time_now = naive_utcnow()
+    return _get_timeout(get_validity(time_now)[1], time_now)
+
+
+def cached_response(rv):
+    """Make a view response cached until the snapshot gets outdated"""
+    return CachedResponse(make_response(rv), timeout=get_cache_timeout())
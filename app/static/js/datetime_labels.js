@@ -15,8 +15,8 @@ const formatDateTimeWithTimeZone = (date) => {
   return localDateTime.replace(/(\d{2})\/(\d{2})\/(\d{4}), (\d{2}:\d{2}) (.+)/, '$3-$2-$1 $4 $5');
 };
 
-const updateDateLabels = () => {
-  document.querySelectorAll('.datetime').forEach((element) => {
+const updateDateLabels = (root = document) => {
+  root.querySelectorAll('.datetime').forEach((element) => {
     const dateTimeStr = element.textContent;
     const dateTimeUTC = new Date(dateTimeStr);
     element.textContent = formatDateTimeWithTimeZone(dateTimeUTC);
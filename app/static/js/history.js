@@ -0,0 +1,30 @@
+// Append older months of the history instead of navigating to them
+document.addEventListener('click', (event) => {
+  const link = event.target.closest('#history-older a');
+  if (!link) return;
+  event.preventDefault();
+  link.classList.add('disabled');
+
+  fetch(link.href)
+    .then((response) => {
+      if (!response.ok) throw new Error(response.statusText);
+      return response.text();
+    })
+    .then((html) => {
+      const page = new DOMParser().parseFromString(html, 'text/html');
+      const months = page.getElementById('history');
+      updateDateLabels(months);
+      document.getElementById('history').append(...months.children);
+
+      const older = page.getElementById('history-older');
+      const current = document.getElementById('history-older');
+      if (older) {
+        current.replaceWith(document.adoptNode(older));
+      } else {
+        current.remove();
+      }
+    })
+    .catch(() => {
+      window.location.href = link.href;
+    });
+});
@@ -0,0 +1,334 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Synthetic catalog and incident history for load testing
+
+Components of every region and category are generated together with a
+history of incidents, maintenances and their status updates. Incidents and
+maintenances arrive as Poisson processes, incident durations are log-normally
+distributed and impacts follow the configured weights. Rows are inserted with
+bulk inserts in chunks, bypassing the unit of work of the session.
+"""
+import math
+import random
+from datetime import timedelta
+
+from app import db
+from app.datetime import naive_utcnow
+from app.models import Component
+from app.models import ComponentAttribute
+from app.models import Incident
+from app.models import IncidentComponentRelation
+from app.models import IncidentStatus
+from app.models import reserve_ids
+from app.models import sync_id_sequence
+
+from sqlalchemy import insert
+
+
+DEFAULT_IMPACT_WEIGHTS = {1: 6, 2: 3, 3: 1}
+
+INCIDENT_TEXTS = {
+    1: ("Degraded performance", "Increased latency", "Slow responses"),
+    2: ("Increased error rates", "Partial outage", "Failing requests"),
+    3: ("Service unavailable", "Complete outage"),
+}
+MAINTENANCE_TEXT = "Scheduled maintenance"
+
+INCIDENT_PROGRESS = ("analyzing", "fixing", "observing")
+UPDATE_TEXTS = {
+    "analyzing": "The issue is being investigated",
+    "fixing": "The cause has been identified, a fix is being deployed",
+    "observing": "The fix has been deployed, recovery is being monitored",
+    "resolved": "The issue has been resolved",
+    "in progress": "Maintenance is in progress",
+    "completed": "Maintenance is completed",
+}
+
+# Log-normal spread of incident durations
+DURATION_SIGMA = 1.0
+# Maintenances are planned up to that many days ahead
+MAINTENANCE_HORIZON = 30
+
+
+def parse_impact_weights(value):
+    """Parse weights of impacts given as `impact:weight,...`
+
+    :returns: Dictionary of impact -> weight
+    """
+    weights = {}
+    for item in value.split(","):
+        impact, _, weight = item.partition(":")
+        impact = int(impact)
+        if impact not in DEFAULT_IMPACT_WEIGHTS:
+            raise ValueError(f"Unsupported incident impact: {impact}")
+        weights[impact] = float(weight)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("At least one impact must have a positive weight")
+    return weights
+
+
+class Synthesizer:
+    """Generator of a synthetic catalog and history
+
+    :param int regions: Number of regions.
+    :param int categories: Number of categories per region.
+    :param int components: Number of components per category.
+    :param float years: Length of the history.
+    :param float incidents_per_day: Mean number of incidents per day.
+    :param float maintenances_per_month: Mean number of maintenances per
+        month.
+    :param float mean_duration: Mean duration of incidents in minutes.
+    :param float updates: Mean number of status updates per incident before
+        it is resolved.
+    :param int max_components: Maximal number of components affected by an
+        incident or maintenance (all of the same region).
+    :param dict impact_weights: Impact -> relative frequency of incidents.
+    :param int seed: Seed of the random generator.
+    :param datetime now: End of the history, current time by default.
+    """
+
+    def __init__(
+        self,
+        regions=3,
+        categories=4,
+        components=5,
+        years=1,
+        incidents_per_day=5,
+        maintenances_per_month=10,
+        mean_duration=60,
+        updates=2,
+        max_components=3,
+        impact_weights=None,
+        seed=None,
+        now=None,
+    ):
+        self.regions = regions
+        self.categories = categories
+        self.components = components
+        self.years = years
+        self.incidents_per_day = incidents_per_day
+        self.maintenances_per_month = maintenances_per_month
+        self.mean_duration = mean_duration
+        self.updates = updates
+        self.max_components = max_components
+        self.impact_weights = impact_weights or DEFAULT_IMPACT_WEIGHTS
+        self.random = random.Random(seed)
+        self.now = (now or naive_utcnow()).replace(microsecond=0)
+        self.start = self.now - timedelta(days=365 * years)
+
+    def catalog(self):
+        """Yield (name, attributes) of components"""
+        for region in range(1, self.regions + 1):
+            for category in range(1, self.categories + 1):
+                for component in range(1, self.components + 1):
+                    yield (
+                        f"Component{category}-{component}",
+                        {
+                            "region": f"Region{region}",
+                            "category": f"Category{category}",
+                            "type": f"comp{category}-{component}",
+                        },
+                    )
+
+    def _arrivals(self, per_day, start, end):
+        # Poisson process - exponentially distributed inter-arrival times
+        if per_day <= 0:
+            return
+        moment = start
+        while True:
+            moment += timedelta(days=self.random.expovariate(per_day))
+            if moment >= end:
+                return
+            yield moment.replace(microsecond=0)
+
+    def _affected(self, regions):
+        # Components of a single region, mostly just one of them
+        region = self.random.choice(regions)
+        count = 1
+        while count < self.max_components and self.random.random() < 0.3:
+            count += 1
+        return self.random.sample(region, min(count, len(region)))
+
+    def _duration(self):
+        mu = math.log(self.mean_duration) - DURATION_SIGMA**2 / 2
+        minutes = self.random.lognormvariate(mu, DURATION_SIGMA)
+        return timedelta(minutes=max(1, round(minutes)))
+
+    def _incident(self, start_date, regions):
+        impacts = list(self.impact_weights)
+        impact = self.random.choices(
+            impacts, weights=[self.impact_weights[i] for i in impacts]
+        )[0]
+        end_date = start_date + self._duration()
+        if end_date > self.now:
+            end_date = None
+        count = self.random.randint(0, round(2 * self.updates))
+        last = end_date or self.now
+        moments = sorted(
+            start_date + (last - start_date) * self.random.random()
+            for _ in range(count)
+        )
+        updates = [
+            (
+                moment.replace(microsecond=0),
+                INCIDENT_PROGRESS[i * len(INCIDENT_PROGRESS) // count],
+            )
+            for i, moment in enumerate(moments)
+        ]
+        if end_date:
+            updates.append((end_date, "resolved"))
+        return {
+            "text": self.random.choice(INCIDENT_TEXTS[impact]),
+            "start_date": start_date,
+            "end_date": end_date,
+            "impact": impact,
+            "system": self.random.random() < 0.5,
+        }, self._affected(regions), updates
+
+    def _maintenance(self, start_date, regions):
+        end_date = start_date + timedelta(hours=self.random.randint(1, 4))
+        updates = []
+        if start_date <= self.now:
+            updates.append((start_date, "in progress"))
+        if end_date <= self.now:
+            updates.append((end_date, "completed"))
+        return {
+            "text": MAINTENANCE_TEXT,
+            "start_date": start_date,
+            "end_date": end_date,
+            "impact": 0,
+            "system": False,
+        }, self._affected(regions), updates
+
+    def history(self, regions):
+        """Yield (incident row, affected component IDs, list of (timestamp,
+        status) updates) ordered by start of the incidents
+
+        :param list regions: Lists of component IDs of every region.
+        """
+        incidents = self._arrivals(
+            self.incidents_per_day, self.start, self.now
+        )
+        # Maintenances start at full hour and take whole hours
+        maintenances = (
+            moment.replace(minute=0, second=0)
+            for moment in self._arrivals(
+                self.maintenances_per_month / 30,
+                self.start,
+                self.now + timedelta(days=MAINTENANCE_HORIZON),
+            )
+        )
+        next_incident = next(incidents, None)
+        next_maintenance = next(maintenances, None)
+        while next_incident or next_maintenance:
+            if next_maintenance is None or (
+                next_incident and next_incident <= next_maintenance
+            ):
+                yield self._incident(next_incident, regions)
+                next_incident = next(incidents, None)
+            else:
+                yield self._maintenance(next_maintenance, regions)
+                next_maintenance = next(maintenances, None)
+
+    def load(self, chunk_size=10000, progress=None):
+        """Insert the catalog and history into the database
+
+        Every chunk is committed separately.
+
+        :param int chunk_size: Number of incidents inserted at once.
+        :param progress: Callable receiving the dictionary of inserted rows
+            per table after every chunk.
+
+        :returns: Dictionary of table -> number of inserted rows
+        """
+        counts = {
+            "component": 0,
+            "component_attribute": 0,
+            "incident": 0,
+            "incident_component_relation": 0,
+            "incident_status": 0,
+        }
+        regions = self._load_catalog(counts)
+        chunk = []
+        for item in self.history(regions):
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                self._load_history(chunk, counts)
+                chunk = []
+                if progress:
+                    progress(counts)
+        if chunk:
+            self._load_history(chunk, counts)
+            if progress:
+                progress(counts)
+        return counts
+
+    def _load_catalog(self, counts):
+        catalog = list(self.catalog())
+        component_ids = reserve_ids(Component, len(catalog))
+        db.session.execute(
+            insert(Component),
+            [
+                {"id": comp_id, "name": name}
+                for comp_id, (name, _) in zip(component_ids, catalog)
+            ],
+        )
+        attributes = [
+            {"component_id": comp_id, "name": name, "value": value}
+            for comp_id, (_, attrs) in zip(component_ids, catalog)
+            for name, value in attrs.items()
+        ]
+        db.session.execute(insert(ComponentAttribute), attributes)
+        sync_id_sequence(Component)
+        db.session.commit()
+        counts["component"] += len(catalog)
+        counts["component_attribute"] += len(attributes)
+
+        regions = {}
+        for comp_id, (_, attrs) in zip(component_ids, catalog):
+            regions.setdefault(attrs["region"], []).append(comp_id)
+        return list(regions.values())
+
+    def _load_history(self, chunk, counts):
+        incident_ids = reserve_ids(Incident, len(chunk))
+        db.session.execute(
+            insert(Incident),
+            [
+                dict(incident, id=inc_id)
+                for inc_id, (incident, _, _) in zip(incident_ids, chunk)
+            ],
+        )
+        relations = []
+        statuses = []
+        for inc_id, (_, comp_ids, updates) in zip(incident_ids, chunk):
+            relations.extend(
+                {"incident_id": inc_id, "component_id": comp_id}
+                for comp_id in comp_ids
+            )
+            statuses.extend(
+                {
+                    "incident_id": inc_id,
+                    "timestamp": timestamp,
+                    "status": status,
+                    "text": UPDATE_TEXTS[status],
+                }
+                for timestamp, status in updates
+            )
+        db.session.execute(insert(IncidentComponentRelation), relations)
+        if statuses:
+            db.session.execute(insert(IncidentStatus), statuses)
+        sync_id_sequence(Incident)
+        db.session.commit()
+        counts["incident"] += len(chunk)
+        counts["incident_component_relation"] += len(relations)
+        counts["incident_status"] += len(statuses)
@@ -0,0 +1,71 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Persistent bytecode cache of templates
+
+Compiled templates are kept in a directory or in Redis, so that fresh
+workers load them instead of parsing and compiling every template on its
+first use. Entries are bound to the template source and to the Jinja and
+Python versions and are recompiled when any of them changes.
+"""
+import os
+
+from app import get_redis_client
+
+from jinja2 import FileSystemBytecodeCache
+from jinja2 import MemcachedBytecodeCache
+from jinja2 import TemplateError
+
+REDIS_KEY_PREFIX = "sdb_jinja_bytecode:"
+
+
+def init_bytecode_cache(app, cache_config):
+    """Configure the bytecode cache of the application templates
+
+    :param app: Flask application.
+    :param dict cache_config: Cache configuration, used to connect to Redis.
+    """
+    backend = app.config["TEMPLATE_BYTECODE_CACHE"]
+    if not backend:
+        return
+    if backend == "filesystem":
+        directory = app.config["TEMPLATE_BYTECODE_CACHE_DIR"] or os.path.join(
+            app.instance_path, "jinja_cache"
+        )
+        os.makedirs(directory, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(directory)
+    elif backend == "redis":
+        # Redis client accepts the (key, value, timeout) of memcached
+        bytecode_cache = MemcachedBytecodeCache(
+            get_redis_client(cache_config), prefix=REDIS_KEY_PREFIX
+        )
+    else:
+        raise ValueError(f"Unsupported template bytecode cache: {backend}")
+    app.jinja_env.bytecode_cache = bytecode_cache
+
+
+def compile_templates(app):
+    """Compile all templates of the application into the bytecode cache
+
+    :returns: Tuple of (list of compiled template names, dictionary of
+        template name -> error)
+    """
+    compiled = []
+    errors = {}
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateError as e:
+            errors[name] = str(e)
+        else:
+            compiled.append(name)
+    return compiled, errors
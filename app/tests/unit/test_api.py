@@ -12,6 +12,10 @@
 #
 import datetime
 import json
+import os
+import tempfile
+import threading
+import time
 from unittest import TestCase
 
 
@@ -22,10 +26,13 @@ from app.models import Base
 from app.models import Component
 from app.models import ComponentAttribute
 from app.models import Incident
+from app.models import IncidentStatus
 
 
 import jwt
 
+from sqlalchemy import event
+
 
 class TestBase(TestCase):
 
@@ -85,6 +92,78 @@ class TestComponentStatus(TestBase):
         res = self.client.get("/api/v1/component_status")
         self.assertEqual(200, res.status_code)
 
+    def test_get_history(self):
+        with self.app.app_context():
+            inc = db.session.scalars(db.select(Incident)).one()
+            for idx in range(3):
+                db.session.add(
+                    IncidentStatus(
+                        incident_id=inc.id,
+                        text=f"update{idx}",
+                        status="analyzing",
+                        timestamp=naive_utcnow()
+                        - datetime.timedelta(days=1, minutes=idx),
+                    )
+                )
+            db.session.commit()
+        res = self.client.get(
+            "/api/v1/component_status?name=cmp1&attribute_name=a2"
+            "&attribute_value=v2"
+        )
+        self.assertEqual(200, res.status_code)
+        # Closed incidents are listed with all their updates
+        self.assertEqual(["inc"], [i["text"] for i in res.json["incidents"]])
+        self.assertEqual(
+            ["update0", "update1", "update2"],
+            [u["text"] for u in res.json["incidents"][0]["updates"]],
+        )
+        res = self.client.get("/api/v1/component_status?name=cmp")
+        self.assertEqual(["cmp1", "cmp2"], [c["name"] for c in res.json])
+        self.assertEqual(1, len(res.json[0]["incidents"]))
+
+    def test_get_conditional(self):
+        res = self.client.get("/api/v1/component_status")
+        etag = res.headers["ETag"]
+
+        res = self.client.get(
+            "/api/v1/component_status", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(304, res.status_code)
+        self.assertEqual(b"", res.data)
+
+        data = dict(
+            name="cmp1", impact=1, attributes=[{"name": "a1", "value": "v1"}]
+        )
+        self.client.post(
+            "/api/v1/component_status",
+            data=json.dumps(data),
+            content_type="application/json",
+            headers=self.headers,
+        )
+        res = self.client.get(
+            "/api/v1/component_status", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertNotEqual(etag, res.headers["ETag"])
+
+    def test_get_incidents_conditional(self):
+        res = self.client.get("/api/v1/incidents")
+        self.assertNotIn("Last-Modified", res.headers)
+        etag = res.headers["ETag"]
+        res = self.client.get(
+            "/api/v1/incidents", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(304, res.status_code)
+        # Every write is noticed, even within the same second
+        with self.app.app_context():
+            inc = db.session.scalars(db.select(Incident)).first()
+            inc.text = "renamed"
+            db.session.commit()
+        res = self.client.get(
+            "/api/v1/incidents", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(200, res.status_code)
+
     def test_post_unauthorized(self):
         data = dict(
             name="cmp1", impact=1, attributes=[{"name": "a1", "value": "v1"}]
@@ -139,10 +218,10 @@ class TestComponentStatus(TestBase):
             self.assertEqual(maintenance_id, res.json["id"])
 
             self.assertEqual(0, len(Incident.get_active()))
-            maintenance = Incident.get_active_maintenance()
-            self.assertIsNotNone(maintenance)
-            self.assertIsInstance(maintenance, Incident)
-            self.assertEqual(maintenance_id, maintenance.id)
+            self.assertEqual(
+                [maintenance_id],
+                [i.id for i in Incident.get_all_active() if i.impact == 0],
+            )
 
     def test_post_active_maintenance_other_component(self):
         maintenance_id = None
@@ -175,10 +254,10 @@ class TestComponentStatus(TestBase):
             self.assertNotEqual(maintenance_id, res.json["id"])
 
             self.assertEqual(1, len(Incident.get_active()))
-            maintenance = Incident.get_active_maintenance()
-            self.assertIsNotNone(maintenance)
-            self.assertIsInstance(maintenance, Incident)
-            self.assertEqual(maintenance_id, maintenance.id)
+            self.assertEqual(
+                [maintenance_id],
+                [i.id for i in Incident.get_all_active() if i.impact == 0],
+            )
 
     def test_post_active_incident(self):
         inc_id = None
@@ -349,8 +428,7 @@ class TestComponentStatus(TestBase):
             self.assertEqual(1, len(Incident.get_active()))
             self.assertEqual(impact2, res3.json["impact"])
             incident_active = Incident.get_active()[0]
-            for inc in Incident.get_all_closed():
-                self.assertNotEqual(inc.id, res3.json["id"])
+            self.assertIsNone(res3.json["end_date"])
             self.assertEqual(incident_active.id, res3.json["id"])
             # Checking status updates
             comp1 = Component.find_by_name_and_attributes(
@@ -365,3 +443,679 @@ class TestComponentStatus(TestBase):
                 self.assertTrue(
                     False, f"comp name {comp_name} not found in {res_updates}"
                 )
+
+
+class TestAvailability(TestBase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            comp1 = Component(
+                name="cmp1",
+                attributes=[
+                    ComponentAttribute(name="region", value="Reg1"),
+                    ComponentAttribute(name="category", value="Cat1"),
+                ],
+            )
+            comp2 = Component(
+                name="cmp2",
+                attributes=[
+                    ComponentAttribute(name="region", value="Reg1"),
+                    ComponentAttribute(name="category", value="Cat2"),
+                ],
+            )
+            db.session.add(comp1)
+            db.session.add(comp2)
+            self.end = naive_utcnow() - datetime.timedelta(days=1)
+            db.session.add(
+                Incident(
+                    text="outage",
+                    components=[comp1],
+                    impact=3,
+                    start_date=self.end - datetime.timedelta(hours=6),
+                    end_date=self.end,
+                )
+            )
+            db.session.commit()
+
+    def test_component(self):
+        res = self.client.get(
+            "/api/v1/availability",
+            query_string={
+                "component": "cmp1",
+                "region": "Reg1",
+                "from": (self.end - datetime.timedelta(hours=12)).isoformat(),
+                "to": self.end.isoformat(),
+            },
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(1, len(res.json))
+        self.assertEqual("cmp1", res.json[0]["name"])
+        self.assertAlmostEqual(360, res.json[0]["outage_minutes"])
+        self.assertAlmostEqual(0.5, res.json[0]["availability"])
+
+    def test_region(self):
+        res = self.client.get(
+            "/api/v1/availability", query_string={"region": "Reg1"}
+        )
+        self.assertEqual(200, res.status_code)
+        sla = {item["name"]: item["availability"] for item in res.json}
+        self.assertAlmostEqual(1 - 6 / (30 * 24), sla["cmp1"], places=4)
+        self.assertEqual(1, sla["cmp2"])
+
+    def test_invalidated(self):
+        query = {"region": "Reg1", "component": "cmp2"}
+        res = self.client.get("/api/v1/availability", query_string=query)
+        self.assertEqual(1, res.json[0]["availability"])
+        with self.app.app_context():
+            comp2 = Component.find_by_name_and_attributes(
+                "cmp2", {"region": "Reg1"}
+            )
+            db.session.add(
+                Incident(
+                    text="outage",
+                    components=[comp2],
+                    impact=3,
+                    start_date=self.end - datetime.timedelta(hours=6),
+                    end_date=self.end,
+                )
+            )
+            db.session.commit()
+        res = self.client.get("/api/v1/availability", query_string=query)
+        self.assertLess(res.json[0]["availability"], 1)
+
+    def test_not_found(self):
+        res = self.client.get(
+            "/api/v1/availability", query_string={"component": "cmp3"}
+        )
+        self.assertEqual(404, res.status_code)
+
+    def test_bad_window(self):
+        res = self.client.get(
+            "/api/v1/availability",
+            query_string={"from": "2024-02-01", "to": "2024-01-01"},
+        )
+        self.assertEqual(400, res.status_code)
+
+
+class TestIncidents(TestBase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            comp1 = Component(
+                name="cmp1",
+                attributes=[ComponentAttribute(name="region", value="Reg1")],
+            )
+            comp2 = Component(
+                name="cmp2",
+                attributes=[ComponentAttribute(name="region", value="Reg2")],
+            )
+            db.session.add(comp1)
+            db.session.add(comp2)
+            time_now = naive_utcnow()
+            for idx in range(5):
+                db.session.add(
+                    Incident(
+                        text=f"inc{idx}",
+                        components=[comp1 if idx % 2 else comp2],
+                        impact=idx % 4,
+                        start_date=time_now - datetime.timedelta(days=idx),
+                        end_date=(
+                            time_now - datetime.timedelta(hours=1)
+                            if idx
+                            else None
+                        ),
+                        system=bool(idx % 2),
+                    )
+                )
+            db.session.commit()
+            self.comp1_id = comp1.id
+
+    def get_texts(self, **query):
+        res = self.client.get("/api/v1/incidents", query_string=query)
+        self.assertEqual(200, res.status_code)
+        return [item["text"] for item in res.json]
+
+    def test_pagination(self):
+        res = self.client.get("/api/v1/incidents", query_string={"limit": 2})
+        self.assertEqual(["inc0", "inc1"], [i["text"] for i in res.json])
+        texts = []
+        while "Link" in res.headers:
+            next_url = res.headers["Link"].split(";")[0].strip("<>")
+            res = self.client.get(next_url)
+            texts.extend(item["text"] for item in res.json)
+        self.assertEqual(["inc2", "inc3", "inc4"], texts)
+
+    def test_filters(self):
+        self.assertEqual(["inc0"], self.get_texts(active="true"))
+        self.assertEqual(["inc1", "inc3"], self.get_texts(system="true"))
+        self.assertEqual(["inc2"], self.get_texts(impact=2))
+        self.assertEqual(
+            ["inc1", "inc3"], self.get_texts(component_id=self.comp1_id)
+        )
+        self.assertEqual(
+            ["inc0", "inc2", "inc4"], self.get_texts(region="Reg2")
+        )
+        start_after = naive_utcnow() - datetime.timedelta(days=1, hours=1)
+        self.assertEqual(
+            ["inc0", "inc1"],
+            self.get_texts(start_after=start_after.isoformat()),
+        )
+
+    def test_bad_limit(self):
+        res = self.client.get("/api/v1/incidents", query_string={"limit": 0})
+        self.assertEqual(422, res.status_code)
+
+    def test_export(self):
+        with self.app.app_context():
+            ids = [inc.id for inc in Incident.iter_all(chunk_size=2)]
+        res = self.client.get("/api/v1/incidents/export")
+        self.assertEqual(200, res.status_code)
+        self.assertEqual("application/x-ndjson", res.mimetype)
+        lines = [json.loads(line) for line in res.data.splitlines()]
+        self.assertEqual(ids, [item["id"] for item in lines])
+        self.assertEqual(5, len(ids))
+        self.assertEqual(
+            [{"name": "region", "value": "Reg2"}],
+            lines[0]["components"][0]["attributes"],
+        )
+
+
+class TestComponentStatusBatch(TestBase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        payload = {"stackmon": "dummy"}
+        encoded = jwt.encode(
+            payload, self.app.config["SECRET_KEY"], algorithm="HS256"
+        )
+        self.headers = {"Authorization": f"bearer {encoded}"}
+
+        with self.app.app_context():
+            for idx in range(6):
+                db.session.add(
+                    Component(
+                        name=f"cmp{idx}",
+                        attributes=[
+                            ComponentAttribute(name="region", value="Reg1")
+                        ],
+                    )
+                )
+            db.session.commit()
+
+    def post(self, signals):
+        return self.client.post(
+            "/api/v1/component_status/batch",
+            data=json.dumps(signals),
+            content_type="application/json",
+            headers=self.headers,
+        )
+
+    @staticmethod
+    def signal(name, impact):
+        return dict(
+            name=name,
+            impact=impact,
+            attributes=[{"name": "region", "value": "Reg1"}],
+        )
+
+    def count_queries(self, signals):
+        statements = []
+
+        def before_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with self.app.app_context():
+            event.listen(db.engine, "before_cursor_execute", before_execute)
+            try:
+                res = self.post(signals)
+            finally:
+                event.remove(
+                    db.engine, "before_cursor_execute", before_execute
+                )
+        self.assertEqual(200, res.status_code)
+        return len([s for s in statements if s.startswith("SELECT")])
+
+    def test_unauthorized(self):
+        res = self.client.post(
+            "/api/v1/component_status/batch",
+            data=json.dumps([self.signal("cmp0", 1)]),
+            content_type="application/json",
+        )
+        self.assertEqual(401, res.status_code)
+
+    def test_batch(self):
+        res = self.post(
+            [
+                self.signal("cmp0", 1),
+                self.signal("cmp1", 1),
+                self.signal("cmp0", 1),
+                self.signal("cmp1", 2),
+                self.signal("cmp9", 1),
+                self.signal("cmp2", 5),
+            ]
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(
+            [201, 201, 409, 201, 400, 400],
+            [item["status"] for item in res.json],
+        )
+        first = res.json[0]["incident"]["id"]
+        self.assertEqual(first, res.json[1]["incident"]["id"])
+        self.assertEqual(first, res.json[2]["incident"]["id"])
+        # cmp1 is moved into a new incident with higher impact
+        self.assertNotEqual(first, res.json[3]["incident"]["id"])
+        self.assertEqual(2, res.json[3]["incident"]["impact"])
+        self.assertIn(
+            "moved from", res.json[3]["incident"]["updates"][0]["text"]
+        )
+        with self.app.app_context():
+            self.assertEqual(2, len(Incident.get_active()))
+
+    def test_constant_queries(self):
+        self.post([self.signal("cmp0", 1)])
+        small = self.count_queries([self.signal("cmp1", 1)])
+        large = self.count_queries(
+            [self.signal(f"cmp{idx}", 1) for idx in range(2, 6)]
+            + [self.signal("cmp0", 1)]
+        )
+        self.assertEqual(small, large)
+
+
+class TestComponentStatusCoalescing(TestComponentStatusBatch):
+    test_config = dict(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        API_COALESCING_WINDOW=60,
+    )
+
+    def post_single(self, name, impact):
+        return self.client.post(
+            "/api/v1/component_status",
+            data=json.dumps(self.signal(name, impact)),
+            content_type="application/json",
+            headers=self.headers,
+        )
+
+    def get_counters(self):
+        return self.client.get("/api/v1/component_status/coalescing").json
+
+    def test_batch(self):
+        res = self.post(
+            [
+                self.signal("cmp0", 1),
+                self.signal("cmp1", 1),
+                self.signal("cmp0", 1),
+                self.signal("cmp1", 2),
+                self.signal("cmp9", 1),
+                self.signal("cmp2", 5),
+            ]
+        )
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(
+            [201, 409, 409, 201, 400, 400],
+            [item["status"] for item in res.json],
+        )
+        first = res.json[0]["incident"]["id"]
+        self.assertEqual(first, res.json[2]["incident"]["id"])
+        # The escalation of cmp1 is applied at once
+        self.assertEqual(2, res.json[3]["incident"]["impact"])
+        self.assertEqual(
+            res.json[3]["incident"]["id"], res.json[1]["incident"]["id"]
+        )
+        self.assertFalse(
+            [
+                update
+                for update in res.json[3]["incident"]["updates"]
+                if "moved from" in update["text"]
+            ]
+        )
+        self.assertEqual(
+            {"window": 60, "duplicate": 0, "merged": 2}, self.get_counters()
+        )
+
+    def test_duplicate(self):
+        res = self.post_single("cmp0", 1)
+        self.assertEqual(201, res.status_code)
+        statements = []
+
+        def before_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with self.app.app_context():
+            event.listen(db.engine, "before_cursor_execute", before_execute)
+            try:
+                duplicate = self.post_single("cmp0", 1)
+            finally:
+                event.remove(
+                    db.engine, "before_cursor_execute", before_execute
+                )
+        self.assertEqual(409, duplicate.status_code)
+        self.assertEqual(
+            res.json["id"], duplicate.json["existingIncidentId"]
+        )
+        self.assertEqual("cmp0 (Reg1)", duplicate.json["targetComponent"])
+        self.assertEqual([], statements)
+        self.assertEqual(1, self.get_counters()["duplicate"])
+
+    def test_escalation(self):
+        self.post_single("cmp0", 1)
+        res = self.post_single("cmp0", 2)
+        self.assertEqual(201, res.status_code)
+        self.assertEqual(2, res.json["impact"])
+        # Lower impact signals are covered by the escalated incident
+        res = self.post_single("cmp0", 1)
+        self.assertEqual(409, res.status_code)
+        self.assertEqual(1, self.get_counters()["duplicate"])
+
+    def test_closed_incident(self):
+        res = self.post_single("cmp0", 1)
+        with self.app.app_context():
+            incident = db.session.get(Incident, res.json["id"])
+            incident.end_date = naive_utcnow()
+            db.session.commit()
+        res = self.post_single("cmp0", 1)
+        self.assertEqual(201, res.status_code)
+        self.assertEqual(0, self.get_counters()["duplicate"])
+
+
+class TestEvents(TestBase):
+    test_config = dict(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        API_EVENTS_HISTORY=3,
+        API_EVENTS_KEEPALIVE=0.01,
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        encoded = jwt.encode(
+            {"stackmon": "dummy"},
+            self.app.config["SECRET_KEY"],
+            algorithm="HS256",
+        )
+        self.headers = {"Authorization": f"bearer {encoded}"}
+
+        with self.app.app_context():
+            for idx in range(2):
+                db.session.add(
+                    Component(
+                        name=f"cmp{idx}",
+                        attributes=[
+                            ComponentAttribute(name="region", value="Reg1")
+                        ],
+                    )
+                )
+            db.session.commit()
+
+    def post(self, name, impact=1):
+        res = self.client.post(
+            "/api/v1/component_status",
+            data=json.dumps(
+                dict(
+                    name=name,
+                    impact=impact,
+                    attributes=[{"name": "region", "value": "Reg1"}],
+                )
+            ),
+            content_type="application/json",
+            headers=self.headers,
+        )
+        self.assertEqual(201, res.status_code)
+        return res.json
+
+    @staticmethod
+    def read(stream, count):
+        events = []
+        for chunk in stream:
+            chunk = chunk.decode()
+            if chunk.startswith(":") and events:
+                # Nothing more to read
+                return events
+            if not chunk.startswith(("id:", "event:")):
+                continue
+            fields = dict(
+                line.split(": ", 1) for line in chunk.strip().split("\n")
+            )
+            events.append(
+                (fields.get("id"), fields["event"], json.loads(fields["data"]))
+            )
+            if len(events) == count:
+                return events
+
+    def test_resume(self):
+        incident = self.post("cmp0")
+        self.post("cmp1")
+        res = self.client.get("/api/v1/events", headers={"Last-Event-ID": 1})
+        self.assertEqual(200, res.status_code)
+        self.assertEqual("text/event-stream", res.mimetype)
+        self.assertEqual(
+            [
+                ("2", "component.status", 1),
+                ("3", "incident.updated", incident["id"]),
+                ("4", "component.status", 2),
+            ],
+            [
+                (item_id, event_type, data.get("component_id") or data["id"])
+                for item_id, event_type, data in self.read(
+                    iter(res.response), 3
+                )
+            ],
+        )
+        res.close()
+
+    def test_live(self):
+        res = self.client.get("/api/v1/events")
+        stream = iter(res.response)
+        # Retry interval and keep-alive
+        self.assertTrue(next(stream).startswith(b"retry:"))
+        self.assertEqual(b": keep-alive\n\n", next(stream))
+        incident = self.post("cmp0", impact=2)
+        events = self.read(stream, 2)
+        self.assertEqual("incident.opened", events[0][1])
+        self.assertEqual(2, events[0][2]["impact"])
+        self.assertEqual(
+            {
+                "change": "added",
+                "component_id": 1,
+                "impact": 2,
+                "incident_id": incident["id"],
+            },
+            events[1][2],
+        )
+        res.close()
+
+    def test_reset(self):
+        self.post("cmp0")
+        self.post("cmp1")
+        self.post("cmp1", impact=2)
+        res = self.client.get("/api/v1/events?last_event_id=1")
+        self.assertEqual(
+            [(None, "reset", {})], self.read(iter(res.response), 1)
+        )
+        res.close()
+
+    def test_max_age(self):
+        self.app.config["API_EVENTS_MAX_AGE"] = 0.05
+        res = self.client.get("/api/v1/events")
+        # The stream ends by itself after keep-alives
+        chunks = list(res.response)
+        self.assertTrue(chunks[0].startswith(b"retry:"))
+        self.assertEqual({b": keep-alive\n\n"}, set(chunks[1:]))
+        res.close()
+
+    def test_max_streams(self):
+        self.app.config["API_EVENTS_MAX_STREAMS"] = 1
+        res = self.client.get("/api/v1/events")
+        self.assertEqual(200, res.status_code)
+        rejected = self.client.get("/api/v1/events")
+        self.assertEqual(503, rejected.status_code)
+        self.assertEqual("30", rejected.headers["Retry-After"])
+        # The slot is released once the stream is closed
+        res.close()
+        res = self.client.get("/api/v1/events")
+        self.assertEqual(200, res.status_code)
+        res.close()
+
+
+class TestComponentStatusConcurrency(TestBase):
+    """Signals posted concurrently must not open duplicate incidents"""
+
+    threads = 16
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_config = dict(
+            TESTING=True,
+            SQLALCHEMY_DATABASE_URI="sqlite:///"
+            + os.path.join(self.tmpdir.name, "test.sqlite"),
+        )
+        super().setUp()
+        encoded = jwt.encode(
+            {"stackmon": "dummy"},
+            self.app.config["SECRET_KEY"],
+            algorithm="HS256",
+        )
+        self.headers = {"Authorization": f"bearer {encoded}"}
+
+        with self.app.app_context():
+            for idx in range(self.threads // 2):
+                db.session.add(
+                    Component(
+                        name=f"cmp{idx}",
+                        attributes=[
+                            ComponentAttribute(name="region", value="Reg1")
+                        ],
+                    )
+                )
+            db.session.commit()
+
+    def tearDown(self):
+        super().tearDown()
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def post_signal(self, idx, results, barrier):
+        client = self.app.test_client()
+        data = dict(
+            name=f"cmp{idx % (self.threads // 2)}",
+            impact=2,
+            attributes=[{"name": "region", "value": "Reg1"}],
+        )
+        barrier.wait()
+        res = client.post(
+            "/api/v1/component_status",
+            data=json.dumps(data),
+            content_type="application/json",
+            headers=self.headers,
+        )
+        results[idx] = res.status_code
+
+    def test_concurrent_signals(self):
+        results = [None] * self.threads
+        barrier = threading.Barrier(self.threads)
+        workers = [
+            threading.Thread(
+                target=self.post_signal, args=(idx, results, barrier)
+            )
+            for idx in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        # Every component is reported twice, the second signal conflicts
+        self.assertEqual(self.threads // 2, results.count(201))
+        self.assertEqual(self.threads // 2, results.count(409))
+        with self.app.app_context():
+            incidents = Incident.get_active()
+            self.assertEqual(1, len(incidents))
+            self.assertEqual(self.threads // 2, len(incidents[0].components))
+
+
+class TestComponentStatusAsync(TestBase):
+    test_config = dict(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        API_ASYNC_INGESTION=True,
+        API_INGESTION_LOCAL_QUEUE=True,
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        encoded = jwt.encode(
+            {"stackmon": "dummy"},
+            self.app.config["SECRET_KEY"],
+            algorithm="HS256",
+        )
+        self.headers = {"Authorization": f"bearer {encoded}"}
+
+        with self.app.app_context():
+            db.session.add(
+                Component(
+                    name="cmp1",
+                    attributes=[
+                        ComponentAttribute(name="region", value="Reg1")
+                    ],
+                )
+            )
+            db.session.commit()
+
+    def post(self, name):
+        return self.client.post(
+            "/api/v1/component_status",
+            data=json.dumps(
+                dict(
+                    name=name,
+                    impact=2,
+                    attributes=[{"name": "region", "value": "Reg1"}],
+                )
+            ),
+            content_type="application/json",
+            headers=self.headers,
+        )
+
+    def wait_for_job(self, location):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            res = self.client.get(location, headers=self.headers)
+            self.assertEqual(200, res.status_code)
+            if res.json["state"] != "queued":
+                return res.json
+            time.sleep(0.05)
+        self.fail("Job was not processed")
+
+    def test_queued(self):
+        res = self.post("cmp1")
+        self.assertEqual(202, res.status_code)
+        job = self.wait_for_job(res.headers["Location"])
+        self.assertEqual("done", job["state"])
+        self.assertEqual(201, job["status"])
+        with self.app.app_context():
+            incident = db.session.get(Incident, job["incident_id"])
+            self.assertEqual(2, incident.impact)
+
+        job = self.wait_for_job(self.post("cmp1").headers["Location"])
+        self.assertEqual(409, job["status"])
+
+    def test_unknown_component(self):
+        self.assertEqual(400, self.post("cmp2").status_code)
+
+    def test_unknown_job(self):
+        res = self.client.get(
+            "/api/v1/component_status/jobs/unknown", headers=self.headers
+        )
+        self.assertEqual(404, res.status_code)
+
+    def test_local_queue_not_allowed(self):
+        with self.assertRaises(RuntimeError):
+            create_app(
+                dict(self.test_config, API_INGESTION_LOCAL_QUEUE=False)
+            )
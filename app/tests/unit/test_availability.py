@@ -0,0 +1,165 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+import datetime
+from unittest import TestCase
+
+from app.availability import OutageIndex
+from app.availability import OutageMatrix
+from app.availability import merge_intervals
+from app.availability import month_availability
+
+
+class TestOutageMatrix(TestCase):
+    def setUp(self):
+        self.jan = datetime.datetime(2024, 1, 1)
+        self.feb = datetime.datetime(2024, 2, 1)
+        self.mar = datetime.datetime(2024, 3, 1)
+
+    def test_merge_intervals(self):
+        components, starts, ends = merge_intervals(
+            [2, 1, 1, 1],
+            [
+                datetime.datetime(2024, 1, 5),
+                datetime.datetime(2024, 1, 2),
+                datetime.datetime(2024, 1, 1),
+                datetime.datetime(2024, 1, 10),
+            ],
+            [
+                datetime.datetime(2024, 1, 6),
+                datetime.datetime(2024, 1, 4),
+                datetime.datetime(2024, 1, 3),
+                datetime.datetime(2024, 1, 11),
+            ],
+        )
+        self.assertEqual([1, 1, 2], components)
+        self.assertEqual(datetime.datetime(2024, 1, 1), starts[0])
+        self.assertEqual(datetime.datetime(2024, 1, 4), ends[0])
+
+    def test_build_clips_months(self):
+        matrix = OutageMatrix.build(
+            [1, 2],
+            [
+                datetime.datetime(2024, 1, 31, 23, 0),
+                datetime.datetime(2024, 2, 10, 0, 0),
+            ],
+            [
+                datetime.datetime(2024, 2, 1, 1, 0),
+                datetime.datetime(2024, 2, 10, 0, 30),
+            ],
+        )
+        self.assertEqual([self.jan, self.feb], matrix.months)
+        self.assertEqual([1, 2], matrix.component_ids)
+        self.assertEqual(
+            [(1, self.jan, 60), (1, self.feb, 60), (2, self.feb, 30)],
+            list(matrix.items()),
+        )
+
+    def test_build_given_months(self):
+        matrix = OutageMatrix.build(
+            [1],
+            [datetime.datetime(2023, 12, 31)],
+            [datetime.datetime(2024, 1, 2)],
+            [self.mar, self.jan],
+        )
+        self.assertEqual([self.jan, self.mar], matrix.months)
+        self.assertEqual([[24 * 60, 0]], matrix.minutes)
+
+    def test_availability(self):
+        matrix = OutageMatrix.build(
+            [1],
+            [datetime.datetime(2024, 2, 1)],
+            [datetime.datetime(2024, 2, 2)],
+            [self.feb, self.mar],
+        )
+        sla = matrix.availability(datetime.datetime(2024, 3, 2))
+        self.assertAlmostEqual(28 / 29, sla[1][self.feb])
+        self.assertEqual(1, sla[1][self.mar])
+
+    def test_month_availability_current_month(self):
+        self.assertEqual(
+            0.5,
+            month_availability(
+                self.feb, 12 * 60, datetime.datetime(2024, 2, 2)
+            ),
+        )
+        self.assertEqual(
+            1, month_availability(self.mar, 0, datetime.datetime(2024, 2, 2))
+        )
+
+
+class TestOutageIndex(TestCase):
+    def setUp(self):
+        self.index = OutageIndex(
+            [1, 1, 1],
+            [
+                datetime.datetime(2024, 1, 1, 0, 0),
+                datetime.datetime(2024, 1, 1, 0, 30),
+                datetime.datetime(2024, 1, 2, 0, 0),
+            ],
+            [
+                datetime.datetime(2024, 1, 1, 1, 0),
+                datetime.datetime(2024, 1, 1, 2, 0),
+                datetime.datetime(2024, 1, 2, 1, 0),
+            ],
+        )
+
+    def test_outage_minutes(self):
+        self.assertEqual(
+            180,
+            self.index.outage_minutes(
+                1, datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 1)
+            ),
+        )
+        # Window cuts both outages
+        self.assertEqual(
+            90,
+            self.index.outage_minutes(
+                1,
+                datetime.datetime(2024, 1, 1, 1, 0),
+                datetime.datetime(2024, 1, 2, 0, 30),
+            ),
+        )
+        # Window inside of a single outage
+        self.assertEqual(
+            10,
+            self.index.outage_minutes(
+                1,
+                datetime.datetime(2024, 1, 2, 0, 10),
+                datetime.datetime(2024, 1, 2, 0, 20),
+            ),
+        )
+        # Window without outages and unknown component
+        self.assertEqual(
+            0,
+            self.index.outage_minutes(
+                1,
+                datetime.datetime(2024, 1, 1, 3, 0),
+                datetime.datetime(2024, 1, 1, 4, 0),
+            ),
+        )
+        self.assertEqual(
+            0,
+            self.index.outage_minutes(
+                2, datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 1)
+            ),
+        )
+
+    def test_availability(self):
+        self.assertEqual(
+            0.5,
+            self.index.availability(
+                1,
+                datetime.datetime(2024, 1, 2, 0, 0),
+                datetime.datetime(2024, 1, 2, 2, 0),
+            ),
+        )
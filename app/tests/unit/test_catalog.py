@@ -0,0 +1,333 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+import os
+import tempfile
+from unittest import TestCase
+
+from app import cache
+from app import catalog
+from app import cli
+from app import create_app
+from app import db
+from app.datetime import naive_utcnow
+from app.models import Base
+from app.models import Component
+from app.models import ComponentAttribute
+from app.models import Incident
+from app.queries import track_queries
+
+from sqlalchemy import insert
+from sqlalchemy import update
+
+import yaml
+
+
+def entry(name, region, category):
+    return {
+        "name": name,
+        "attributes": {"region": region, "category": category},
+    }
+
+
+class TestProvision(TestCase):
+
+    test_config = dict(
+        TESTING=True, SQLALCHEMY_DATABASE_URI="sqlite:///:memory:"
+    )
+
+    def setUp(self):
+        self.app = create_app(self.test_config)
+        cli.register(self.app)
+        with self.app.app_context():
+            Base.metadata.create_all(bind=db.engine)
+            db.create_all()
+        self.catalog = [
+            entry("comp1", "Reg1", "Cat1"),
+            entry("comp2", "Reg1", "Cat1"),
+            entry("comp1", "Reg2", "Cat1"),
+        ]
+        self.provision()
+
+    def provision(self, *args):
+        self.app.config["CATALOG"] = {"components": self.catalog}
+        res = self.app.test_cli_runner().invoke(
+            args=["bootstrap", "provision", *args]
+        )
+        self.assertEqual(0, res.exit_code, res.output)
+        return res.output
+
+    def catalog_state(self):
+        with self.app.app_context():
+            return sorted(
+                (
+                    comp.name,
+                    tuple(sorted(comp.get_attributes_as_dict().items())),
+                )
+                for comp in Component.all()
+            )
+
+    def test_provision(self):
+        self.assertEqual(
+            [
+                ("comp1", (("category", "Cat1"), ("region", "Reg1"))),
+                ("comp1", (("category", "Cat1"), ("region", "Reg2"))),
+                ("comp2", (("category", "Cat1"), ("region", "Reg1"))),
+            ],
+            self.catalog_state(),
+        )
+        output = self.provision()
+        self.assertIn("0 to add, 0 to update, 3 unchanged", output)
+
+    def test_update(self):
+        self.catalog[1] = entry("comp2", "Reg1", "Cat2")
+        self.catalog.append(entry("comp3", "Reg1", "Cat2"))
+        output = self.provision("--dry-run")
+        self.assertIn("+ comp3 category=Cat2 region=Reg1", output)
+        self.assertIn("~ comp2 [2]: category Cat1 -> Cat2", output)
+        self.assertIn("1 to add, 1 to update, 2 unchanged", output)
+        self.assertEqual(3, len(self.catalog_state()))
+
+        self.provision()
+        state = self.catalog_state()
+        self.assertIn(
+            ("comp2", (("category", "Cat2"), ("region", "Reg1"))), state
+        )
+        self.assertIn(
+            ("comp3", (("category", "Cat2"), ("region", "Reg1"))), state
+        )
+        with self.app.app_context():
+            self.assertEqual(
+                2, Component.get_index().count({"category": "Cat2"})
+            )
+
+    def test_prune(self):
+        with self.app.app_context():
+            comp = Component.find_by_name_and_attributes(
+                "comp1", {"region": "Reg2"}
+            )
+            comp_id = comp.id
+            db.session.add(
+                Incident(
+                    text="inc",
+                    impact=3,
+                    start_date=naive_utcnow(),
+                    components=[comp],
+                )
+            )
+            db.session.commit()
+        del self.catalog[2]
+
+        output = self.provision()
+        self.assertIn("1 not in the catalog (retired with --prune)", output)
+        self.assertEqual(3, len(self.catalog_state()))
+
+        output = self.provision("--prune", "--dry-run")
+        self.assertIn("- comp1 category=Cat1 region=Reg2", output)
+        self.assertIn("1 to retire", output)
+        self.assertEqual(3, len(self.catalog_state()))
+
+        self.provision("--prune")
+        self.assertEqual(2, len(self.catalog_state()))
+        with self.app.app_context():
+            self.assertIsNone(
+                Component.find_by_name_and_attributes(
+                    "comp1", {"region": "Reg2"}
+                )
+            )
+            # Retired component is kept for the incident history
+            comp = db.session.get(Component, comp_id)
+            self.assertTrue(comp.retired)
+            self.assertEqual(1, len(comp.incidents))
+
+        self.catalog.append(entry("comp1", "Reg2", "Cat1"))
+        output = self.provision("--prune")
+        self.assertIn(f"~ comp1 [{comp_id}]: restored", output)
+        self.assertEqual(3, len(self.catalog_state()))
+        with self.app.app_context():
+            self.assertEqual(
+                comp_id,
+                Component.find_by_name_and_attributes(
+                    "comp1", {"region": "Reg2"}
+                ).id,
+            )
+
+    def test_changes_of_other_processes(self):
+        with self.app.app_context():
+            pruned = Component.find_by_name_and_attributes(
+                "comp1", {"region": "Reg2"}
+            )
+            # Written by a process not sharing the cache backend
+            comp_id = db.session.execute(
+                insert(Component).values(name="comp4", retired=False)
+            ).inserted_primary_key[0]
+            db.session.execute(
+                insert(ComponentAttribute).values(
+                    component_id=comp_id, name="region", value="Reg3"
+                )
+            )
+            db.session.execute(
+                update(Component)
+                .where(Component.id == pruned.id)
+                .values(retired=True)
+            )
+            db.session.commit()
+            self.assertEqual(
+                0, Component.get_index().count({"region": "Reg3"})
+            )
+
+            self.assertEqual(
+                comp_id,
+                Component.find_by_name_and_attributes(
+                    "comp4", {"region": "Reg3"}
+                ).id,
+            )
+            self.assertIsNone(
+                Component.find_by_name_and_attributes(
+                    "comp1", {"region": "Reg2"}
+                )
+            )
+            self.assertEqual(
+                1, Component.get_index().count({"region": "Reg3"})
+            )
+
+    def test_index_expires(self):
+        with self.app.app_context():
+            Component.get_index()
+            db.session.execute(
+                update(Component)
+                .where(Component.name == "comp2")
+                .values(retired=True)
+            )
+            db.session.commit()
+            self.assertEqual(3, Component.get_index().count({}))
+            version, _, index = self.app.extensions["component_index"]
+            self.app.extensions["component_index"] = (version, 0, index)
+            self.assertEqual(2, Component.get_index().count({}))
+
+    def test_queries(self):
+        self.catalog = [
+            entry(f"comp{idx}", f"Reg{region}", "Cat1")
+            for idx in range(50)
+            for region in range(4)
+        ]
+        with track_queries() as stats:
+            self.provision()
+        self.assertEqual(200, len(self.catalog_state()))
+        self.catalog = [
+            entry(name, region, "Cat2")
+            for name, region in (("comp1", "Reg1"), ("comp2", "Reg2"))
+        ]
+        with track_queries() as update_stats:
+            self.provision("--prune")
+        self.assertEqual(2, len(self.catalog_state()))
+        # Independent of the size of the catalog
+        self.assertLessEqual(stats.count, 5)
+        self.assertLessEqual(update_stats.count, 5)
+
+
+class TestCatalogReload(TestCase):
+
+    test_config = dict(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        CATALOG_RELOAD_INTERVAL=30,
+    )
+
+    def setUp(self):
+        self.app = create_app(self.test_config)
+        with self.app.app_context():
+            Base.metadata.create_all(bind=db.engine)
+            db.create_all()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "catalog.yaml")
+        self.mtime = 1_000_000_000
+        self.write([entry("comp1", "Reg1", "Cat1")])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, components):
+        with open(self.path, "w") as fd:
+            yaml.safe_dump({"components": components}, fd)
+        # Modification time of quickly rewritten files may not change
+        self.mtime += 1_000_000_000
+        os.utime(self.path, ns=(self.mtime, self.mtime))
+
+    def names(self):
+        return sorted(
+            (comp.name, comp.get_attributes_as_dict()["category"])
+            for comp in Component.all()
+        )
+
+    def test_request(self):
+        watcher = self.app.extensions["catalog_watcher"]
+        watcher.path = self.path
+        self.app.test_client().get("/")
+        with self.app.app_context():
+            self.assertEqual([("comp1", "Cat1")], self.names())
+        self.assertEqual(
+            "comp1", self.app.config["CATALOG"]["components"][0]["name"]
+        )
+
+    def test_workers(self):
+        workers = [
+            catalog.CatalogWatcher(self.app, self.path, 0) for _ in range(2)
+        ]
+        with self.app.app_context():
+            for worker in workers:
+                worker.check()
+            components = [
+                entry("comp1", "Reg1", "Cat2"),
+                entry("comp2", "Reg1", "Cat1"),
+            ]
+            self.write(components)
+            workers[0].check()
+            self.assertEqual(
+                [("comp1", "Cat2"), ("comp2", "Cat1")], self.names()
+            )
+            # The catalog is applied once, other workers only take it over
+            with track_queries() as stats:
+                workers[1].check()
+            self.assertEqual(0, stats.count)
+            self.assertEqual(
+                components, self.app.config["CATALOG"]["components"]
+            )
+            # Nothing happens until the file changes again
+            with track_queries() as stats:
+                workers[0].check()
+            self.assertEqual(0, stats.count)
+
+    def test_locked(self):
+        watcher = catalog.CatalogWatcher(self.app, self.path, 0)
+        with self.app.app_context():
+            cache.set(catalog.RELOAD_LOCK_CACHE_KEY, "other")
+            watcher.check()
+            self.assertEqual([], self.names())
+            cache.delete(catalog.RELOAD_LOCK_CACHE_KEY)
+            watcher.check()
+            self.assertEqual([("comp1", "Cat1")], self.names())
+
+    def test_invalid(self):
+        watcher = catalog.CatalogWatcher(self.app, self.path, 0)
+        with self.app.app_context():
+            watcher.check()
+            with open(self.path, "w") as fd:
+                fd.write("components: [")
+            os.utime(self.path, ns=(self.mtime + 1, self.mtime + 1))
+            with self.assertLogs(self.app.logger, "ERROR"):
+                watcher.check()
+            self.assertEqual([("comp1", "Cat1")], self.names())
+            self.assertEqual(
+                [entry("comp1", "Reg1", "Cat1")],
+                self.app.config["CATALOG"]["components"],
+            )
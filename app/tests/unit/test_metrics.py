@@ -0,0 +1,154 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+import json
+from unittest import TestCase
+
+from app import create_app
+from app import db
+from app.datetime import naive_utcnow
+from app.models import Base
+from app.models import Component
+from app.models import ComponentAttribute
+from app.models import Incident
+
+import jwt
+
+from prometheus_client import REGISTRY
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(TestCase):
+
+    test_config = dict(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        METRICS_ENABLED=True,
+    )
+
+    def setUp(self):
+        self.app = create_app(self.test_config)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            Base.metadata.create_all(bind=db.engine)
+            db.create_all()
+            for idx in range(2):
+                db.session.add(
+                    Component(
+                        name=f"cmp{idx}",
+                        attributes=[
+                            ComponentAttribute(name="region", value="Reg1")
+                        ],
+                    )
+                )
+            db.session.commit()
+        encoded = jwt.encode(
+            {"stackmon": "dummy"},
+            self.app.config["SECRET_KEY"],
+            algorithm="HS256",
+        )
+        self.headers = {"Authorization": f"bearer {encoded}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            Base.metadata.drop_all(bind=db.engine)
+
+    def post(self, name, impact):
+        return self.client.post(
+            "/api/v1/component_status",
+            data=json.dumps(
+                dict(
+                    name=name,
+                    impact=impact,
+                    attributes=[{"name": "region", "value": "Reg1"}],
+                )
+            ),
+            content_type="application/json",
+            headers=self.headers,
+        )
+
+    def test_requests(self):
+        labels = dict(method="GET", endpoint="/")
+        requests = sample("sdb_request_duration_seconds_count", **labels)
+        queries = sample("sdb_request_db_queries_sum", endpoint="/")
+        misses = sample(
+            "sdb_cache_operations_total", family="index", result="miss"
+        )
+        hits = sample(
+            "sdb_cache_operations_total", family="index", result="hit"
+        )
+        self.client.get("/")
+        self.client.get("/")
+        self.assertEqual(
+            requests + 2,
+            sample("sdb_request_duration_seconds_count", **labels),
+        )
+        self.assertLess(
+            queries, sample("sdb_request_db_queries_sum", endpoint="/")
+        )
+        self.assertEqual(
+            misses + 1,
+            sample(
+                "sdb_cache_operations_total", family="index", result="miss"
+            ),
+        )
+        self.assertEqual(
+            hits + 1,
+            sample(
+                "sdb_cache_operations_total", family="index", result="hit"
+            ),
+        )
+
+        res = self.client.get("/metrics")
+        self.assertEqual(200, res.status_code)
+        self.assertIn(b"sdb_request_duration_seconds_bucket", res.data)
+
+    def test_disabled_by_default(self):
+        app = create_app(
+            dict(TESTING=True, SQLALCHEMY_DATABASE_URI="sqlite:///:memory:")
+        )
+        self.assertEqual(404, app.test_client().get("/metrics").status_code)
+
+    def test_incident_writes(self):
+        actions = ("open", "attach", "move", "impact_change", "close")
+        before = {
+            action: sample("sdb_incident_writes_total", action=action)
+            for action in actions
+        }
+        # Open, attach, then move cmp1 into a new incident
+        self.assertEqual(201, self.post("cmp0", 1).status_code)
+        self.assertEqual(201, self.post("cmp1", 1).status_code)
+        self.assertEqual(201, self.post("cmp1", 2).status_code)
+        # Impact of the single component incident is changed
+        self.assertEqual(201, self.post("cmp0", 3).status_code)
+        with self.app.app_context():
+            for incident in Incident.get_all_active():
+                incident.end_date = naive_utcnow()
+            db.session.commit()
+        self.assertEqual(
+            {
+                "open": 2,
+                "attach": 1,
+                "move": 1,
+                "impact_change": 1,
+                "close": 2,
+            },
+            {
+                action: sample("sdb_incident_writes_total", action=action)
+                - before[action]
+                for action in actions
+            },
+        )
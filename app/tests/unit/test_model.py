@@ -19,8 +19,11 @@ from app.datetime import naive_utcnow
 from app.models import Base
 from app.models import Component
 from app.models import ComponentAttribute
+from app.models import ComponentSlaMonth
 from app.models import Incident
 from app.models import IncidentStatus
+from app.models import WriteLock
+from app.snapshot import get_snapshot
 
 
 class TestBase(TestCase):
@@ -66,6 +69,33 @@ class TestComponent(TestBase):
             t3 = Component.find_by_name_and_attributes("cmp2", {"a2": "v2"})
             self.assertIsNone(t3)
 
+    def test_find_by_name_and_attributes_index_refresh(self):
+        with self.app.app_context():
+            self.assertIsNone(
+                Component.find_by_name_and_attributes("cmp3", {"a1": "v1"})
+            )
+            db.session.add(
+                Component(
+                    name="cmp3",
+                    attributes=[ComponentAttribute(name="a1", value="v1")],
+                )
+            )
+            db.session.commit()
+            t1 = Component.find_by_name_and_attributes("cmp3", {"a1": "v1"})
+            self.assertEqual("cmp3", t1.name)
+            t1.attributes[0].value = "v3"
+            db.session.commit()
+            self.assertIsNone(
+                Component.find_by_name_and_attributes("cmp3", {"a1": "v1"})
+            )
+
+    def test_count_components_by_attributes(self):
+        with self.app.app_context():
+            index = Component.get_index()
+            self.assertEqual(2, index.count({"a1": "v1"}))
+            self.assertEqual(1, index.count({"a1": "v1", "a2": "v2"}))
+            self.assertEqual(0, index.count({"a3": "v1"}))
+
     def test_get_attributes_as_dict(self):
         with self.app.app_context():
             t1 = Component.find_by_name_and_attributes("cmp1", {"a1": "v1"})
@@ -77,6 +107,36 @@ class TestComponent(TestBase):
         with self.app.app_context():
             self.assertTrue(len(Component.all()) > 0)
 
+    def test_get_region_category_tree(self):
+        with self.app.app_context():
+            for name, region, category in [
+                ("cmp4", "Reg2", "Cat1"),
+                ("cmp3", "Reg1", "Cat2"),
+                ("cmp5", "Reg1", "Cat2"),
+                ("cmp6", "Reg1", "Cat1"),
+            ]:
+                db.session.add(
+                    Component(
+                        name=name,
+                        attributes=[
+                            ComponentAttribute(name="region", value=region),
+                            ComponentAttribute(
+                                name="category", value=category
+                            ),
+                        ],
+                    )
+                )
+            db.session.commit()
+            tree = Component.get_region_category_tree()
+            self.assertEqual(["Reg1", "Reg2"], [r["region"] for r in tree])
+            categories = tree[0]["categories"]
+            self.assertEqual(["Cat1", "Cat2"], [c["name"] for c in categories])
+            self.assertEqual(2, categories[1]["rowspan"])
+            self.assertEqual(
+                ["cmp3", "cmp5"],
+                [comp.name for comp in categories[1]["components"]],
+            )
+
 
 class TestComponentAttribute(TestBase):
     def setUp(self):
@@ -131,11 +191,6 @@ class TestIncident(TestBase):
             t1 = Incident.get_all_active()
             self.assertEqual(2, len(t1))
 
-    def test_get_active_maintenance(self):
-        with self.app.app_context():
-            t1 = Incident.get_active_maintenance()
-            self.assertEqual("Maintenance1", t1.text)
-
     def test_get_active(self):
         with self.app.app_context():
             t1 = Incident.get_active()
@@ -153,6 +208,47 @@ class TestIncident(TestBase):
             self.assertEqual(set(["v2"]), t1.get_attributes_by_key("a2"))
 
 
+class TestPlannedMaintenance(TestBase):
+    def setUp(self):
+        super().setUp()
+        with self.app.app_context():
+            comp1 = Component(name="cmp1")
+            comp2 = Component(name="cmp2")
+            comp3 = Component(name="cmp3")
+            db.session.add_all([comp1, comp2, comp3])
+            now = naive_utcnow()
+            later = Incident(
+                text="Later",
+                impact=0,
+                start_date=now + datetime.timedelta(days=2),
+                components=[comp1, comp2],
+            )
+            sooner = Incident(
+                text="Sooner",
+                impact=0,
+                start_date=now + datetime.timedelta(days=1),
+                components=[comp1],
+            )
+            active = Incident(
+                text="Active",
+                impact=0,
+                start_date=now - datetime.timedelta(days=1),
+                components=[comp3],
+            )
+            db.session.add_all([later, sooner, active])
+            db.session.commit()
+            self.comp_ids = [comp1.id, comp2.id, comp3.id]
+
+    def test_planned_maintenance(self):
+        with self.app.app_context():
+            comp1, comp2, comp3 = [
+                get_snapshot().components[comp_id] for comp_id in self.comp_ids
+            ]
+            self.assertEqual("Sooner", comp1.planned.text)
+            self.assertEqual("Later", comp2.planned.text)
+            self.assertIsNone(comp3.planned)
+
+
 class TestIncidentUpdate(TestBase):
     def setUp(self):
         super().setUp()
@@ -171,3 +267,101 @@ class TestIncidentUpdate(TestBase):
             db.session.commit()
             t1 = Incident.get_by_id(self.inc_id)
             self.assertEqual(1, len(t1.updates))
+
+
+class TestComponentSlaMonth(TestBase):
+    def setUp(self):
+        super().setUp()
+        with self.app.app_context():
+            comp1 = Component(name="cmp1")
+            comp2 = Component(name="cmp2")
+            db.session.add(comp1)
+            db.session.add(comp2)
+            # Outage crossing the month boundary
+            db.session.add(
+                Incident(
+                    text="Outage1",
+                    impact=3,
+                    start_date=datetime.datetime(2024, 1, 31, 23, 0),
+                    end_date=datetime.datetime(2024, 2, 1, 1, 0),
+                    components=[comp1],
+                )
+            )
+            # Overlapping outage must not be counted twice
+            db.session.add(
+                Incident(
+                    text="Outage2",
+                    impact=3,
+                    start_date=datetime.datetime(2024, 2, 1, 0, 0),
+                    end_date=datetime.datetime(2024, 2, 1, 2, 0),
+                    components=[comp1],
+                )
+            )
+            db.session.add(
+                Incident(
+                    text="Minor",
+                    impact=1,
+                    start_date=datetime.datetime(2024, 2, 1, 0, 0),
+                    end_date=datetime.datetime(2024, 2, 2, 0, 0),
+                    components=[comp2],
+                )
+            )
+            db.session.commit()
+            self.comp1_id = comp1.id
+            self.comp2_id = comp2.id
+
+    def test_update_components(self):
+        with self.app.app_context():
+            ComponentSlaMonth.update_components()
+            db.session.commit()
+            rows = {
+                (r.component_id, r.month): r.outage_minutes
+                for r in db.session.scalars(db.select(ComponentSlaMonth))
+            }
+            self.assertDictEqual(
+                {
+                    (self.comp1_id, datetime.datetime(2024, 1, 1)): 60,
+                    (self.comp1_id, datetime.datetime(2024, 2, 1)): 120,
+                },
+                rows,
+            )
+
+    def test_get_sla_by_months(self):
+        months = [datetime.datetime(2024, 2, 1), datetime.datetime(2024, 3, 1)]
+        with self.app.app_context():
+            ComponentSlaMonth.update_components()
+            db.session.commit()
+            sla = ComponentSlaMonth.get_sla_by_months(months)
+            self.assertNotIn(self.comp2_id, sla)
+            self.assertEqual(1, sla[self.comp1_id][months[1]])
+            self.assertAlmostEqual(
+                1 - 120 / (29 * 24 * 60), sla[self.comp1_id][months[0]]
+            )
+
+    def test_update_incident(self):
+        with self.app.app_context():
+            ComponentSlaMonth.update_components()
+            inc = db.session.scalars(
+                db.select(Incident).where(Incident.text == "Minor")
+            ).one()
+            inc.impact = 3
+            ComponentSlaMonth.update_incident(inc, 1)
+            db.session.commit()
+            row = db.session.get(
+                ComponentSlaMonth,
+                (self.comp2_id, datetime.datetime(2024, 2, 1)),
+            )
+            self.assertEqual(24 * 60, row.outage_minutes)
+
+
+class TestWriteLock(TestBase):
+    def test_acquire(self):
+        with self.app.app_context():
+            # The row is created on first use and reused afterwards
+            for _ in range(2):
+                WriteLock.acquire("incident")
+                db.session.commit()
+            self.assertEqual(
+                ["incident"],
+                db.session.scalars(db.select(WriteLock.name)).all(),
+            )
@@ -0,0 +1,268 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+import datetime
+import json
+from unittest import TestCase
+
+from app import create_app
+from app import db
+from app.datetime import naive_utcnow
+from app.models import Base
+from app.models import Component
+from app.models import ComponentAttribute
+from app.models import Incident
+from app.models import IncidentStatus
+from app.queries import fingerprint
+from app.queries import track_queries
+
+import jwt
+
+# Queries building the dashboard snapshot, used by most views on a cold cache
+SNAPSHOT_QUERIES = 7
+
+
+class QueryBudgetMixin:
+    """Assertions on the number of SQL queries issued by requests"""
+
+    def assertMaxQueries(self, max_queries, method, url, **kwargs):
+        """Issue the request and assert it used at most `max_queries`
+
+        :returns: The response
+        """
+        with track_queries() as stats:
+            res = getattr(self.client, method)(url, **kwargs)
+            # Streamed responses query while being consumed
+            res.get_data()
+        if stats.count > max_queries:
+            statements = "\n".join(
+                f"{count}x {statement}"
+                for statement, count in stats.statements.most_common()
+            )
+            self.fail(
+                f"{method.upper()} {url} issued {stats.count} queries, "
+                f"expected at most {max_queries}:\n{statements}"
+            )
+        return res
+
+
+class TestQueryBudget(QueryBudgetMixin, TestCase):
+    """Number of queries must not depend on the amount of data"""
+
+    test_config = dict(
+        TESTING=True, SQLALCHEMY_DATABASE_URI="sqlite:///:memory:"
+    )
+    regions = 5
+
+    def setUp(self):
+        self.app = create_app(self.test_config)
+        self.client = self.app.test_client()
+        encoded = jwt.encode(
+            {"stackmon": "dummy"},
+            self.app.config["SECRET_KEY"],
+            algorithm="HS256",
+        )
+        self.headers = {"Authorization": f"bearer {encoded}"}
+
+        with self.app.app_context():
+            Base.metadata.create_all(bind=db.engine)
+            db.create_all()
+            components = []
+            for region in range(self.regions):
+                for category in range(2):
+                    for idx in range(3):
+                        components.append(
+                            Component(
+                                name=f"cmp{idx}",
+                                attributes=[
+                                    ComponentAttribute(
+                                        name="region", value=f"Reg{region}"
+                                    ),
+                                    ComponentAttribute(
+                                        name="category", value=f"Cat{category}"
+                                    ),
+                                ],
+                            )
+                        )
+            db.session.add_all(components)
+            now = naive_utcnow()
+            active = Incident(
+                text="active",
+                impact=2,
+                start_date=now - datetime.timedelta(hours=1),
+                components=components[:: self.regions],
+            )
+            planned = Incident(
+                text="planned",
+                impact=0,
+                start_date=now + datetime.timedelta(days=1),
+                end_date=now + datetime.timedelta(days=2),
+                components=components[1:: self.regions],
+            )
+            closed = [
+                Incident(
+                    text=f"closed{idx}",
+                    impact=1,
+                    start_date=now - datetime.timedelta(days=idx + 1),
+                    end_date=now - datetime.timedelta(days=idx),
+                    components=components[idx:: self.regions],
+                )
+                for idx in range(self.regions)
+            ]
+            # History of a single component, longer than the budgets
+            past = [
+                Incident(
+                    text=f"past{idx}",
+                    impact=1,
+                    start_date=now - datetime.timedelta(days=idx + 10),
+                    end_date=now - datetime.timedelta(days=idx + 9),
+                    components=[components[0]],
+                )
+                for idx in range(8)
+            ]
+            db.session.add_all([active, planned] + closed + past)
+            db.session.flush()
+            for incident in [active] + closed + past:
+                for idx in range(3):
+                    db.session.add(
+                        IncidentStatus(
+                            incident_id=incident.id,
+                            text=f"update{idx}",
+                            status="analyzing",
+                            timestamp=now - datetime.timedelta(minutes=idx),
+                        )
+                    )
+            db.session.commit()
+            self.active_id = active.id
+            self.closed_id = closed[0].id
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            Base.metadata.drop_all(bind=db.engine)
+
+    def signal(self, name, impact):
+        return dict(
+            name=name,
+            impact=impact,
+            attributes=[{"name": "region", "value": "Reg1"}],
+        )
+
+    def test_index(self):
+        self.assertMaxQueries(SNAPSHOT_QUERIES + 3, "get", "/")
+
+    def test_history(self):
+        # Validity period, latest month, incidents of the page and presence
+        # of older ones
+        self.assertMaxQueries(4, "get", "/history")
+
+    def test_availability(self):
+        self.assertMaxQueries(2, "get", "/availability")
+
+    def test_not_modified(self):
+        for url in ("/", "/history", "/rss/?mt=Reg0"):
+            etag = self.client.get(url).headers["ETag"]
+            res = self.assertMaxQueries(
+                0, "get", url, headers={"If-None-Match": etag}
+            )
+            self.assertEqual(304, res.status_code)
+
+    def test_incident(self):
+        self.assertMaxQueries(
+            SNAPSHOT_QUERIES + 7, "get", f"/incidents/{self.active_id}"
+        )
+        self.assertMaxQueries(4, "get", f"/incidents/{self.closed_id}")
+
+    def test_rss(self):
+        # Validity period, component lookup index and the incidents of the
+        # region
+        self.assertMaxQueries(3, "get", "/rss/?mt=Reg0")
+        # Component lookup, its incidents and their updates
+        self.assertMaxQueries(4, "get", "/rss/?mt=Reg0&srv=cmp0")
+
+    def test_api_component_status(self):
+        # Components, attributes, incidents and their updates
+        self.assertMaxQueries(4, "get", "/api/v1/component_status")
+        # The component lookup index is loaded
+        self.assertMaxQueries(
+            5,
+            "get",
+            "/api/v1/component_status?name=cmp0&attribute_name=region"
+            "&attribute_value=Reg0",
+        )
+
+    def test_api_component_status_post(self):
+        res = self.assertMaxQueries(
+            12,
+            "post",
+            "/api/v1/component_status",
+            data=json.dumps(self.signal("cmp1", 1)),
+            content_type="application/json",
+            headers=self.headers,
+        )
+        self.assertEqual(201, res.status_code)
+
+    def test_api_component_status_batch(self):
+        res = self.assertMaxQueries(
+            15,
+            "post",
+            "/api/v1/component_status/batch",
+            data=json.dumps(
+                [self.signal(f"cmp{idx}", 1) for idx in range(3)]
+            ),
+            content_type="application/json",
+            headers=self.headers,
+        )
+        self.assertEqual(200, res.status_code)
+
+    def test_api_incidents(self):
+        self.assertMaxQueries(3, "get", "/api/v1/incidents")
+        self.assertMaxQueries(4, "get", "/api/v1/incidents/export")
+
+    def test_api_availability(self):
+        self.assertMaxQueries(3, "get", "/api/v1/availability")
+
+
+class TestQueryTracking(TestCase):
+    def test_fingerprint(self):
+        self.assertEqual(
+            "SELECT a FROM t WHERE t.id IN (...)",
+            fingerprint("SELECT a\n FROM t\n WHERE t.id IN (?, ?, ?)"),
+        )
+        self.assertEqual(
+            fingerprint("SELECT a FROM t WHERE t.id IN (%(p_1)s)"),
+            fingerprint("SELECT a FROM t WHERE t.id IN (%(p_1)s, %(p_2)s)"),
+        )
+
+    def test_repeated_queries_logged(self):
+        app = create_app(
+            dict(
+                TESTING=True,
+                SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+                SQL_REPEATED_QUERY_THRESHOLD=2,
+                SQL_QUERY_BUDGET=1,
+            )
+        )
+        with app.app_context():
+            Base.metadata.create_all(bind=db.engine)
+
+        @app.route("/repeated")
+        def repeated():
+            for _ in range(2):
+                db.session.get(Component, 1)
+            return "done"
+
+        with self.assertLogs(app.logger, "WARNING") as logs:
+            app.test_client().get("/repeated")
+        self.assertEqual(2, len(logs.output))
+        self.assertIn("Possible N+1 queries in GET /repeated", logs.output[0])
+        self.assertIn("more than the budget of 1", logs.output[1])
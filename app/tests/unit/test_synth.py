@@ -0,0 +1,136 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+from datetime import datetime
+from unittest import TestCase
+
+from app import cli
+from app import create_app
+from app import db
+from app.models import Base
+from app.models import Component
+from app.models import ComponentSlaMonth
+from app.models import Incident
+from app.models import IncidentStatus
+from app.synth import Synthesizer
+from app.synth import parse_impact_weights
+
+from sqlalchemy import func
+from sqlalchemy import select
+
+
+class TestSynth(TestCase):
+
+    test_config = dict(
+        TESTING=True, SQLALCHEMY_DATABASE_URI="sqlite:///:memory:"
+    )
+
+    def setUp(self):
+        self.app = create_app(self.test_config)
+        with self.app.app_context():
+            Base.metadata.create_all(bind=db.engine)
+            db.create_all()
+
+    def count(self, model):
+        return db.session.scalar(select(func.count()).select_from(model))
+
+    def test_history(self):
+        now = datetime(2024, 6, 1)
+        synthesizer = Synthesizer(
+            regions=2,
+            categories=2,
+            components=2,
+            years=0.5,
+            incidents_per_day=4,
+            impact_weights={3: 1},
+            seed=1,
+            now=now,
+        )
+        regions = [[1, 2, 3, 4], [5, 6, 7, 8]]
+        history = list(synthesizer.history(regions))
+        starts = [incident["start_date"] for incident, _, _ in history]
+        self.assertEqual(sorted(starts), starts)
+        incidents = [item for item in history if item[0]["impact"]]
+        # Roughly 4 incidents a day for half a year
+        self.assertTrue(500 < len(incidents) < 950, len(incidents))
+        for incident, comp_ids, updates in history:
+            self.assertIn(incident["impact"], (0, 3))
+            self.assertTrue(
+                set(comp_ids) <= set(regions[0])
+                or set(comp_ids) <= set(regions[1])
+            )
+            timestamps = [timestamp for timestamp, _ in updates]
+            self.assertEqual(sorted(timestamps), timestamps)
+            if incident["impact"] and incident["end_date"]:
+                self.assertEqual("resolved", updates[-1][1])
+                self.assertEqual(incident["end_date"], timestamps[-1])
+        # Same seed generates the same history
+        self.assertEqual(
+            history,
+            list(
+                Synthesizer(
+                    regions=2,
+                    categories=2,
+                    components=2,
+                    years=0.5,
+                    incidents_per_day=4,
+                    impact_weights={3: 1},
+                    seed=1,
+                    now=now,
+                ).history(regions)
+            ),
+        )
+
+    def test_parse_impact_weights(self):
+        self.assertEqual({1: 2.0, 3: 1.0}, parse_impact_weights("1:2,3:1"))
+        self.assertRaises(ValueError, parse_impact_weights, "0:1")
+        self.assertRaises(ValueError, parse_impact_weights, "1:0")
+        self.assertRaises(ValueError, parse_impact_weights, "x")
+
+    def test_command(self):
+        cli.register(self.app)
+        res = self.app.test_cli_runner().invoke(
+            args=[
+                "bootstrap",
+                "synth",
+                "--regions=2",
+                "--categories=3",
+                "--components=4",
+                "--years=0.2",
+                "--chunk-size=50",
+                "--seed=1",
+            ]
+        )
+        self.assertEqual(0, res.exit_code, res.output)
+        with self.app.app_context():
+            self.assertEqual(24, self.count(Component))
+            incidents = self.count(Incident)
+            self.assertGreater(incidents, 100)
+            self.assertIn(f"incident: {incidents}", res.output)
+            self.assertIn(
+                f"incident_status: {self.count(IncidentStatus)}", res.output
+            )
+            self.assertGreater(self.count(ComponentSlaMonth), 0)
+            self.assertEqual(
+                12, Component.get_index().count({"region": "Region1"})
+            )
+            # Components added through the ORM get following IDs
+            db.session.add(Component(name="new"))
+            db.session.commit()
+
+    def test_command_invalid_weights(self):
+        cli.register(self.app)
+        res = self.app.test_cli_runner().invoke(
+            args=["bootstrap", "synth", "--impact-weights=5:1"]
+        )
+        self.assertEqual(2, res.exit_code)
+        self.assertIn("Unsupported incident impact", res.output)
@@ -11,15 +11,22 @@
 # under the License.
 #
 import datetime
+import os
+import tempfile
 from unittest import TestCase
 
+from app import cli
 from app import create_app
 from app import db
+from app.availability import last_months
 from app.datetime import naive_utcnow
+from app.generation import get_generation
 from app.models import Base
 from app.models import Component
 from app.models import ComponentAttribute
 from app.models import Incident
+from app.snapshot import get_snapshot
+from app.snapshot import get_validity
 
 
 class TestBase(TestCase):
@@ -80,3 +87,246 @@ class TestWeb(TestBase):
     def test_03_get_incident(self):
         res = self.client.get(f"/incidents/{self.incident_id}")
         self.assertEqual(200, res.status_code)
+
+    def test_04_get_availability(self):
+        res = self.client.get("/availability")
+        self.assertEqual(200, res.status_code)
+
+    def test_05_cached_views_follow_writes(self):
+        self.assertIn(b"inc", self.client.get("/history").data)
+        with self.app.app_context():
+            generation = get_generation()
+            inc = db.session.get(Incident, self.incident_id)
+            inc.text = "renamed incident"
+            db.session.commit()
+            self.assertNotEqual(generation, get_generation())
+        self.assertIn(b"renamed incident", self.client.get("/history").data)
+        self.assertIn(
+            b"renamed incident",
+            self.client.get(f"/incidents/{self.incident_id}").data,
+        )
+
+    def test_06_view_timeout(self):
+        # Per-process cache does not notice writes of other workers
+        self.assertEqual(
+            self.app.config["CACHE_DEFAULT_TIMEOUT"],
+            self.app.config["CACHE_VIEW_TIMEOUT"],
+        )
+        app = create_app(dict(self.test_config, CACHE_VIEW_TIMEOUT=600))
+        self.assertEqual(600, app.config["CACHE_VIEW_TIMEOUT"])
+
+
+class TestHistory(TestBase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        self.months = last_months(naive_utcnow(), 8)
+        with self.app.app_context():
+            # Months 3, 5 and 7 have no incidents
+            for idx in (1, 2, 4, 6):
+                db.session.add(
+                    Incident(
+                        text=f"inc{idx}",
+                        impact=2,
+                        start_date=self.months[idx],
+                        end_date=self.months[idx]
+                        + datetime.timedelta(hours=1),
+                    )
+                )
+            # Open and planned ones are not in the history
+            db.session.add(
+                Incident(text="open", impact=1, start_date=naive_utcnow())
+            )
+            db.session.commit()
+
+    def month(self, idx):
+        return self.months[idx].strftime("%Y-%m")
+
+    def test_pages(self):
+        res = self.client.get("/history")
+        self.assertEqual(200, res.status_code)
+        page = res.data.decode()
+        self.assertIn(self.months[1].strftime("%B %Y"), page)
+        self.assertIn("inc1", page)
+        self.assertIn("inc2", page)
+        self.assertLess(page.index("inc1"), page.index("inc2"))
+        self.assertNotIn("inc4", page)
+        self.assertNotIn("open", page)
+        self.assertIn(f"/history?before={self.month(3)}", page)
+
+        page = self.client.get(f"/history?before={self.month(3)}").data
+        self.assertIn(b"inc4", page)
+        self.assertIn(b"inc6", page)
+        self.assertNotIn(b"inc2", page)
+        self.assertNotIn(b"Load older", page)
+
+        page = self.client.get(f"/history?before={self.month(6)}").data
+        self.assertIn(b"No older incidents", page)
+
+    def test_invalid_before(self):
+        self.assertEqual(400, self.client.get("/history?before=x").status_code)
+
+
+class TestTemplateBytecodeCache(TestBase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_config = dict(
+            TestBase.test_config,
+            TEMPLATE_BYTECODE_CACHE="filesystem",
+            TEMPLATE_BYTECODE_CACHE_DIR=self.tmpdir.name,
+        )
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.tmpdir.cleanup()
+
+    def test_compile_templates(self):
+        cli.register(self.app)
+        res = self.app.test_cli_runner().invoke(args=["compile-templates"])
+        self.assertEqual(0, res.exit_code, res.output)
+        templates = self.app.jinja_env.list_templates()
+        self.assertIn("index.html", templates)
+        self.assertIn(f"Compiled {len(templates)} templates", res.output)
+        self.assertEqual(len(templates), len(os.listdir(self.tmpdir.name)))
+
+        # A fresh worker loads the compiled templates
+        app = create_app(self.test_config)
+        with app.app_context():
+            Base.metadata.create_all(bind=db.engine)
+        self.assertEqual(200, app.test_client().get("/").status_code)
+        self.assertEqual(len(templates), len(os.listdir(self.tmpdir.name)))
+
+    def test_compile_templates_not_configured(self):
+        app = create_app(TestBase.test_config)
+        cli.register(app)
+        res = app.test_cli_runner().invoke(args=["compile-templates"])
+        self.assertEqual(1, res.exit_code)
+        self.assertIn("not configured", res.output)
+
+
+class TestSnapshot(TestBase):
+    def setUp(self):
+        super().setUp()
+        with self.app.app_context():
+            comp1 = Component(
+                name="cmp1",
+                attributes=[
+                    ComponentAttribute(name="region", value="Reg1"),
+                    ComponentAttribute(name="category", value="Cat1"),
+                ],
+            )
+            db.session.add(comp1)
+            db.session.add(
+                Incident(
+                    text="maintenance",
+                    components=[comp1],
+                    impact=0,
+                    start_date=naive_utcnow() + datetime.timedelta(days=1),
+                    end_date=naive_utcnow() + datetime.timedelta(days=2),
+                )
+            )
+            db.session.commit()
+            self.comp1_id = comp1.id
+
+    def test_snapshot(self):
+        with self.app.app_context():
+            snapshot = get_snapshot()
+            self.assertEqual(["Reg1"], snapshot.regions)
+            comp = snapshot.components[self.comp1_id]
+            self.assertIsNone(comp.incident)
+            self.assertEqual("maintenance", comp.planned.text)
+            self.assertEqual(
+                [comp], snapshot.tree[0]["categories"][0]["components"]
+            )
+
+    def test_snapshot_valid_until(self):
+        start = naive_utcnow() + datetime.timedelta(hours=1)
+        with self.app.app_context():
+            db.session.add(
+                Incident(
+                    text="inc",
+                    components=[db.session.get(Component, self.comp1_id)],
+                    impact=2,
+                    start_date=start,
+                )
+            )
+            db.session.commit()
+            # Incidents starting in the future are not planned maintenances
+            snapshot = get_snapshot()
+            self.assertEqual([], snapshot.planned[1:])
+            self.assertEqual(start, snapshot.valid_until)
+            self.assertEqual(start, get_validity()[1])
+
+    def test_snapshot_rebuilt_on_write(self):
+        with self.app.app_context():
+            self.assertEqual([], get_snapshot().incidents)
+            db.session.add(
+                Incident(
+                    text="inc",
+                    components=[db.session.get(Component, self.comp1_id)],
+                    impact=2,
+                    start_date=naive_utcnow(),
+                )
+            )
+            db.session.commit()
+            snapshot = get_snapshot()
+            self.assertEqual(["inc"], [i.text for i in snapshot.incidents])
+            self.assertEqual(
+                "inc", snapshot.components[self.comp1_id].incident.text
+            )
+
+    def test_fragment_versions(self):
+        with self.app.app_context():
+            db.session.add(
+                Component(
+                    name="cmp2",
+                    attributes=[
+                        ComponentAttribute(name="region", value="Reg2"),
+                        ComponentAttribute(name="category", value="Cat1"),
+                    ],
+                )
+            )
+            db.session.commit()
+            before = get_snapshot()
+            self.assertEqual(["Reg1", "Reg2"], before.regions)
+            db.session.add(
+                Incident(
+                    text="inc",
+                    components=[db.session.get(Component, self.comp1_id)],
+                    impact=2,
+                    start_date=naive_utcnow(),
+                )
+            )
+            db.session.commit()
+            after = get_snapshot()
+            # Only the tab of the affected region and the banner change
+            self.assertNotEqual(
+                before.region_versions["Reg1"], after.region_versions["Reg1"]
+            )
+            self.assertEqual(
+                before.region_versions["Reg2"], after.region_versions["Reg2"]
+            )
+            self.assertNotEqual(
+                before.incidents_version, after.incidents_version
+            )
+            self.assertEqual(
+                before.maintenances_version, after.maintenances_version
+            )
+
+    def test_fragments_follow_writes(self):
+        client = self.app.test_client()
+        self.assertNotIn(b"Open Incident", client.get("/").data)
+        with self.app.app_context():
+            db.session.add(
+                Incident(
+                    text="inc",
+                    components=[db.session.get(Component, self.comp1_id)],
+                    impact=2,
+                    start_date=naive_utcnow(),
+                )
+            )
+            db.session.commit()
+        data = client.get("/").data
+        self.assertIn(b"Open Incident", data)
+        self.assertIn(b"Affected Service(s)", data)
@@ -10,24 +10,29 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 #
+from datetime import datetime
 
 from app import authorization
 from app import cache
 from app import oauth
+from app.availability import last_months
+from app.conditional import conditional
 from app.datetime import naive_from_dttz
 from app.datetime import naive_utcnow
+from app.generation import versioned_key
 from app.models import Component
 from app.models import ComponentAttribute
+from app.models import ComponentSlaMonth
 from app.models import Incident
 from app.models import IncidentStatus
 from app.models import db
+from app.snapshot import cached_response
+from app.snapshot import get_snapshot
 from app.web import bp
 from app.web.forms import IncidentForm
 from app.web.forms import IncidentUpdateForm
 from app.web.forms import MaintenanceUpdateForm
 
-from dateutil.relativedelta import relativedelta
-
 from flask import abort
 from flask import current_app
 from flask import flash
@@ -40,15 +45,22 @@ from flask import url_for
 
 @bp.route("/", methods=["GET"])
 @bp.route("/index", methods=["GET"])
-@cache.cached(unless=lambda: "user" in session, key_prefix="/index")
+@conditional(time_dependent=True)
+@cache.cached(
+    unless=lambda: "user" in session,
+    key_prefix=lambda: versioned_key("/index"),
+)
 def index():
-    return render_template(
-        "index.html",
-        title="Status Dashboard",
-        components=Component,
-        component_attributes=ComponentAttribute,
-        incidents=Incident,
-        datetime_labels_script=True,
+    return cached_response(
+        render_template(
+            "index.html",
+            title="Status Dashboard",
+            components=Component,
+            component_attributes=ComponentAttribute,
+            incidents=Incident,
+            snapshot=get_snapshot(),
+            datetime_labels_script=True,
+        )
     )
 
 
@@ -80,6 +92,7 @@ def update_incident(
 
 
 def form_submission(form, incident):
+    old_impact = incident.impact
     new_impact = form.update_impact.data
     new_status = form.update_status.data
     update_date = (
@@ -156,6 +169,13 @@ def form_submission(form, incident):
     incident.text = form.update_title.data
     incident.impact = new_impact
     incident.system = False
+    if new_status in [
+        "resolved",
+        "reopened",
+        "changed",
+        "modified",
+    ] or int(new_impact) != old_impact:
+        ComponentSlaMonth.update_incident(incident, old_impact)
     update_incident(incident, form.update_text.data, new_status, update_date)
 
     return redirect_path
@@ -247,6 +267,7 @@ def new_incident(current_user):
                         else:
                             messages_to.append("Incident closed by system")
                             inc.end_date = naive_utcnow()
+                            ComponentSlaMonth.update_incident(inc)
                 if messages_to:
                     update_incident(inc, ", ".join(messages_to))
             if messages_from:
@@ -267,13 +288,14 @@ def new_incident(current_user):
 
 
 @bp.route("/incidents/<incident_id>", methods=["GET", "POST"])
+@conditional(time_dependent=True)
 @cache.cached(
     unless=lambda: "user" in session,
-    key_prefix=lambda: f"{request.path}",
+    key_prefix=lambda: versioned_key(request.path),
 )
 def incident(incident_id):
     """Manage incident by ID"""
-    incident = Incident.get_by_id(incident_id)
+    incident = Incident.get_by_id(incident_id, with_details=True)
     if not incident:
         abort(404)
 
@@ -335,14 +357,16 @@ def incident(incident_id):
             redirect_path = form_submission(form, incident)
             return redirect(redirect_path)
 
-    return render_template(
-        "incident.html",
-        title="Incident",
-        incident=incident,
-        form=form,
-        now=now,
-        incident_datelabels_script=True,
-        datetime_labels_script=True,
+    return cached_response(
+        render_template(
+            "incident.html",
+            title="Incident",
+            incident=incident,
+            form=form,
+            now=now,
+            incident_datelabels_script=True,
+            datetime_labels_script=True,
+        )
     )
 
 
@@ -390,32 +414,53 @@ def separate_incident(current_user, incident_id, component_id):
 
 
 @bp.route("/history", methods=["GET"])
-@cache.cached(unless=lambda: "user" in session)
+@conditional(time_dependent=True)
+@cache.cached(
+    unless=lambda: "user" in session,
+    key_prefix=lambda: versioned_key(
+        f"{request.path}?before={request.args.get('before', '')}"
+    ),
+)
 def history():
-    return render_template(
-        "history.html",
-        title="Event History",
-        incidents=Incident,
-        datetime_labels_script=True,
+    before = request.args.get("before")
+    if before:
+        try:
+            before = datetime.strptime(before, "%Y-%m")
+        except ValueError:
+            abort(400)
+    months, older = Incident.get_history(
+        before, current_app.config["HISTORY_PAGE_MONTHS"]
+    )
+    return cached_response(
+        render_template(
+            "history.html",
+            title="Event History",
+            months=months,
+            before=before,
+            older=older.strftime("%Y-%m") if older else None,
+            datetime_labels_script=True,
+            history_script=True,
+        )
     )
 
 
 @bp.route("/availability", methods=["GET"])
 @cache.cached(
     unless=lambda: "user" in session,
+    key_prefix=lambda: versioned_key(request.path),
+    # availability of the current month changes with time
     timeout=300,
 )
 def sla():
-    time_now = naive_utcnow()
-    months = [time_now + relativedelta(months=-mon) for mon in range(6)]
+    months = last_months(naive_utcnow(), 6)
 
     return render_template(
         "sla.html",
         title="Component Availability",
-        components=Component,
-        component_attributes=ComponentAttribute,
-        incidents=Incident,
+        tree=Component.get_region_category_tree(),
         months=months,
+        sla_by_component=ComponentSlaMonth.get_sla_by_months(months),
+        default_sla={month: 1 for month in months},
     )
 
 
@@ -0,0 +1,176 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Compare original per-component and batched availability calculation
+
+The per-component side is a copy of `Component.calculate_sla` as it was
+before the availability engine has been introduced, so that the speedup is
+measured against the original algorithm.
+
+.. code-block:: console
+
+   python -m benchmarks.availability --components 3000 --outages 20
+"""
+import argparse
+import datetime
+import random
+import time
+
+from app import create_app
+from app import db
+from app.availability import OutageMatrix
+from app.availability import last_months
+from app.datetime import naive_utcnow
+from app.models import Base
+from app.models import Component
+from app.models import Incident
+from app.models import IncidentComponentRelation
+
+from dateutil.relativedelta import relativedelta
+
+from sqlalchemy import insert
+
+
+def seed(components, outages, years):
+    now = naive_utcnow()
+    span = int(datetime.timedelta(days=365 * years).total_seconds())
+    db.session.execute(
+        insert(Component),
+        [{"id": i, "name": f"Component{i}"} for i in range(1, components + 1)],
+    )
+    incidents = []
+    relations = []
+    for component_id in range(1, components + 1):
+        for _ in range(outages):
+            start = now - datetime.timedelta(seconds=random.randint(0, span))
+            incidents.append(
+                {
+                    "id": len(incidents) + 1,
+                    "text": "Outage",
+                    "impact": 3,
+                    "start_date": start,
+                    "end_date": start
+                    + datetime.timedelta(minutes=random.randint(1, 600)),
+                }
+            )
+            relations.append(
+                {
+                    "incident_id": len(incidents),
+                    "component_id": component_id,
+                }
+            )
+    db.session.execute(insert(Incident), incidents)
+    db.session.execute(insert(IncidentComponentRelation), relations)
+    db.session.commit()
+
+
+def measure(func):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def baseline_sla(component):
+    """Original availability calculation of a single component"""
+    time_now = naive_utcnow()
+    this_month_start = datetime.datetime(time_now.year, time_now.month, 1)
+
+    outages_dict = {}
+    for inc in component.incidents:
+        if inc.impact == 3 and inc.end_date is not None:
+            outages_dict.setdefault(
+                datetime.datetime(inc.end_date.year, inc.end_date.month, 1), []
+            ).append(inc)
+    outages_dict_sorted = dict(sorted(outages_dict.items()))
+
+    prev_month_minutes = 0
+
+    months = [
+        this_month_start + relativedelta(months=-mon) for mon in range(6)
+    ]
+    sla_dict = {month: 1 for month in months}
+
+    for month_start, outage_group in outages_dict_sorted.items():
+        if month_start in months:
+            minutes_in_month = prev_month_minutes
+            outages_minutes = 0
+            prev_month_minutes = 0
+
+            if this_month_start.month == month_start.month:
+                minutes_in_month = (
+                    time_now - month_start
+                ).total_seconds() / 60
+            else:
+                next_month_start = month_start + relativedelta(months=1)
+                minutes_in_month = (
+                    next_month_start - month_start
+                ).total_seconds() / 60
+
+            for outage in outage_group:
+                outage_start = outage.start_date
+                if outage_start < month_start:
+                    diff = month_start - outage_start
+                    prev_month_minutes += diff.total_seconds() / 60
+                    outage_start = month_start
+
+                diff = outage.end_date - outage_start
+                outages_minutes += diff.total_seconds() / 60
+
+            sla_dict[month_start] = (
+                minutes_in_month - outages_minutes
+            ) / minutes_in_month
+
+    return sla_dict
+
+
+def per_component():
+    return {comp.id: baseline_sla(comp) for comp in Component.all()}
+
+
+def batched():
+    time_now = naive_utcnow()
+    return OutageMatrix.build(
+        *Incident.get_outage_intervals(), last_months(time_now, 6)
+    ).availability(time_now)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--components", type=int, default=1000)
+    parser.add_argument(
+        "--outages", type=int, default=10, help="Outages per component"
+    )
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    app = create_app(
+        dict(TESTING=True, SQLALCHEMY_DATABASE_URI="sqlite:///:memory:")
+    )
+    with app.app_context():
+        Base.metadata.create_all(bind=db.engine)
+        seed(args.components, args.outages, args.years)
+
+        per_component_time = measure(per_component)
+        batched_time = measure(batched)
+
+    print(f"components:    {args.components}")
+    print(f"outages:       {args.components * args.outages}")
+    print(f"original:      {per_component_time:.3f}s")
+    print(f"batched:       {batched_time:.3f}s")
+    print(f"speedup:       {per_component_time / batched_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+"""Measure latency, throughput and SQL queries of the hot endpoints
+
+Every scale point is seeded with a synthetic catalog and history, then each
+endpoint is requested with a cold cache (cleared before every request) and
+a warm one. Results are written as JSON and can be compared with the ones
+of a previous release, e.g.:
+
+.. code-block:: console
+
+   python -m benchmarks.endpoints --scale small --scale medium \\
+       --output current.json --baseline previous.json
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from importlib import metadata
+
+from app import cache
+from app import create_app
+from app import db
+from app.datetime import naive_utcnow
+from app.models import Base
+from app.models import Incident
+from app.queries import track_queries
+from app.synth import Synthesizer
+
+import jwt
+
+from sqlalchemy import func
+from sqlalchemy import select
+
+
+# Name -> arguments of `app.synth.Synthesizer`
+SCALES = {
+    "small": dict(
+        regions=2, categories=3, components=5, years=1, incidents_per_day=5
+    ),
+    "medium": dict(
+        regions=5, categories=6, components=10, years=3, incidents_per_day=20
+    ),
+    "large": dict(
+        regions=10,
+        categories=10,
+        components=20,
+        years=5,
+        incidents_per_day=100,
+    ),
+}
+
+# Warm latency growing over the tolerance (and by more than the noise
+# floor in seconds) or additional queries are regressions
+DEFAULT_TOLERANCE = 0.2
+NOISE_FLOOR = 0.001
+
+
+def get_endpoints(incident_id):
+    """Return list of (name, method, url, request arguments)"""
+    return [
+        ("index", "get", "/", {}),
+        ("history", "get", "/history", {}),
+        ("availability", "get", "/availability", {}),
+        ("incident", "get", f"/incidents/{incident_id}", {}),
+        ("rss", "get", "/rss/?mt=Region1", {}),
+        ("rss_component", "get", "/rss/?mt=Region1&srv=Component1-1", {}),
+        ("api_component_status", "get", "/api/v1/component_status", {}),
+        ("api_incidents", "get", "/api/v1/incidents", {}),
+    ]
+
+
+def get_signals(app, count):
+    """Return request arguments of `count` component status signals"""
+    token = jwt.encode(
+        {"stackmon": "benchmark"}, app.config["SECRET_KEY"], algorithm="HS256"
+    )
+    return [
+        {
+            "headers": {"Authorization": f"bearer {token}"},
+            "json": {
+                "name": f"Component1-{idx % 5 + 1}",
+                "impact": idx % 3 + 1,
+                "attributes": [{"name": "region", "value": "Region1"}],
+            },
+        }
+        for idx in range(count)
+    ]
+
+
+def summarize(latencies, queries, statuses):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        "requests": len(latencies),
+        "mean": statistics.mean(latencies),
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "max": latencies[-1],
+        "throughput": len(latencies) / total if total else None,
+        "queries": max(queries),
+        "statuses": sorted(set(statuses)),
+    }
+
+
+def run(client, method, url, requests, cold):
+    latencies = []
+    queries = []
+    statuses = []
+    if not cold:
+        # Populate caches first
+        getattr(client, method)(url, **requests[0])
+    for kwargs in requests:
+        if cold:
+            with client.application.app_context():
+                cache.clear()
+        with track_queries() as stats:
+            start = time.perf_counter()
+            res = getattr(client, method)(url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+        queries.append(stats.count)
+        statuses.append(res.status_code)
+    return summarize(latencies, queries, statuses)
+
+
+def bench_scale(params, database_uri, iterations, seed):
+    app = create_app(
+        dict(
+            SQLALCHEMY_DATABASE_URI=database_uri,
+            SECRET_KEY="benchmark-secret-key-of-sufficient-length",
+        )
+    )
+    # Warnings about N+1 queries would be repeated for every request
+    app.logger.setLevel(logging.ERROR)
+    with app.app_context():
+        Base.metadata.drop_all(bind=db.engine)
+        Base.metadata.create_all(bind=db.engine)
+        start = time.perf_counter()
+        rows = Synthesizer(seed=seed, **params).load()
+        seed_time = time.perf_counter() - start
+        incident_id = db.session.scalar(
+            select(func.max(Incident.id)).where(
+                Incident.impact > 0, Incident.end_date.is_not(None)
+            )
+        )
+        cache.clear()
+    client = app.test_client()
+    results = {}
+    for name, method, url, kwargs in get_endpoints(incident_id):
+        results[name] = {
+            "cold": run(client, method, url, [kwargs] * iterations, True),
+            "warm": run(client, method, url, [kwargs] * iterations, False),
+        }
+    # Signals change the data, therefore they go last
+    signals = get_signals(app, 2 * iterations + 1)
+    url = "/api/v1/component_status"
+    results["api_component_status_post"] = {
+        "cold": run(client, "post", url, signals[:iterations], True),
+        "warm": run(client, "post", url, signals[iterations:], False),
+    }
+    return {
+        "params": params,
+        "rows": rows,
+        "seed_time": seed_time,
+        "endpoints": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return list of regressions of results against the baseline"""
+    regressions = []
+    for scale, data in results["scales"].items():
+        previous = baseline.get("scales", {}).get(scale)
+        if previous is None:
+            continue
+        for endpoint, modes in data["endpoints"].items():
+            for mode, current in modes.items():
+                old = previous["endpoints"].get(endpoint, {}).get(mode)
+                if old is None:
+                    continue
+                label = f"{scale} {endpoint} {mode}"
+                if current["queries"] > old["queries"]:
+                    regressions.append(
+                        f"{label}: {current['queries']} queries "
+                        f"(was {old['queries']})"
+                    )
+                if mode == "warm" and current["p50"] > max(
+                    old["p50"] * (1 + tolerance), old["p50"] + NOISE_FLOOR
+                ):
+                    regressions.append(
+                        f"{label}: p50 {current['p50'] * 1000:.2f}ms "
+                        f"(was {old['p50'] * 1000:.2f}ms)"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scale",
+        action="append",
+        choices=sorted(SCALES),
+        help="Scale point to measure, may be repeated (default: small)",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=20, help="Requests per measurement"
+    )
+    parser.add_argument(
+        "--database-uri",
+        help="Database to seed, it is emptied first (default: temporary "
+        "SQLite database)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="File to write JSON results into")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Allowed relative growth of warm p50 latency",
+    )
+    args = parser.parse_args()
+
+    results = {
+        "created": naive_utcnow().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "flask": metadata.version("flask"),
+            "sqlalchemy": metadata.version("sqlalchemy"),
+            "platform": platform.platform(),
+        },
+        "iterations": args.iterations,
+        "scales": {},
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for scale in args.scale or ["small"]:
+            database_uri = args.database_uri or (
+                f"sqlite:///{tmpdir}/{scale}.sqlite"
+            )
+            data = bench_scale(
+                SCALES[scale], database_uri, args.iterations, args.seed
+            )
+            results["scales"][scale] = data
+            print(f"{scale}: {data['rows']['incident']} incidents")
+            for endpoint, modes in data["endpoints"].items():
+                print(
+                    f"  {endpoint:28} "
+                    + "  ".join(
+                        f"{mode} p50 {stats['p50'] * 1000:8.2f}ms "
+                        f"{stats['queries']:3} queries"
+                        for mode, stats in modes.items()
+                    )
+                )
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fd:
+            regressions = compare(results, json.load(fd), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()